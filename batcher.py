@@ -0,0 +1,89 @@
+'''把多个表达式的单课程选课尝试合并为一个批量选课请求。
+
+`stdElectCourse!batchOperator.action` 支持在一个请求中携带 operator0..operatorN。
+各选课循环把待选课程提交给批处理器，批处理器在一个很短的时间窗口内收集请求，
+合并后一次发送，再把每门课程的结果分别交还给等待它的选课循环。
+'''
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+
+class ElectionBatcher:
+    '''按时间窗口合并选课尝试。
+
+    Args:
+        send (Callable[[list[str]], list]): 对一组课程ID发送一次选课请求，
+            返回与课程ID一一对应的结果列表，格式同 `main.elect_course`。
+        window (float): 收集一批请求的时间窗口（秒），从第一门课程进入队列开始计算。
+        max_size (int, optional): 每批最多包含的课程数，达到后立即发送。Defaults to 10.
+        max_workers (int, optional): 同时在途的批量请求数。Defaults to 4.
+    '''
+
+    def __init__(self, send: Callable[[list[str]], list], window: float,
+                 max_size: int = 10, max_workers: int = 4):
+        self.send = send
+        self.window = window
+        self.max_size = max_size
+        self._pending: list[tuple[str, Future]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch')
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit_future(self, course_id: str) -> Future:
+        fut = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Batcher is closed.')
+            self._pending.append((course_id, fut))
+            self._cond.notify()
+        return fut
+
+    def submit(self, course_id: str) -> list:
+        '''提交一门课程并阻塞等待它所在批次的结果。'''
+        return self.submit_future(course_id).result()
+
+    async def asubmit(self, course_id: str) -> list:
+        '''`submit` 的异步版本。'''
+        import asyncio
+
+        return await asyncio.wrap_future(self.submit_future(course_id))
+
+    def close(self):
+        '''发送剩余的请求并停止后台线程。'''
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    break
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_size]
+                self._pending = self._pending[self.max_size:]
+            self._executor.submit(self._flush, batch)
+        self._executor.shutdown(wait=True)
+
+    def _flush(self, batch: list[tuple[str, Future]]):
+        # 多个表达式在同一窗口内提交同一门课程时只发送一次
+        course_ids = list(dict.fromkeys(course_id for course_id, _ in batch))
+        try:
+            results = dict(zip(course_ids, self.send(course_ids)))
+        except BaseException as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        for course_id, fut in batch:
+            fut.set_result(results[course_id])
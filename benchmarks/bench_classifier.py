@@ -0,0 +1,125 @@
+'''比较 `classifier` 与原先的 lxml 解析加逐组关键词判断对选课响应分类的耗时。
+
+语料是与 `batchOperator.action` 格式相同的完整HTML页面，包括成功、已满、冲突、
+限流、服务器错误、多行批量结果和带HTML实体的消息。先检查两种实现对每个响应的
+分类结果完全一致，再分别计时。
+
+用法（在仓库根目录下运行）：
+
+    python benchmarks/bench_classifier.py --responses 20000
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import classifier  # noqa: E402
+
+messages = [
+    '高等数学 选课成功',
+    '大学英语 选课成功 已选上',
+    '你已经选过该课程',
+    '选课失败：该课程人数已满',
+    '选课失败：已经达到上限',
+    '人数已达上限',
+    '选课失败：上课时间冲突',
+    '请不要过快点击，稍后重试',
+    '服务器内部错误，请联系管理员',
+    'HTTP 503 Service Unavailable',
+    '选课失败，请稍后重试',
+    'Unknown error',
+    '课程 &lt;计算机&gt; &amp; 网络 选课成功',
+    '选课失败：学分&quot;超出&quot;上限',
+]
+
+
+def make_response(msgs: list[str]) -> str:
+    '''生成一个完整的选课结果页面，每条消息占结果表格的一行。'''
+    rows = ''.join(f'\n  <tr>\n    <td style="text-align:center">\n      <div class="result">{msg}</div>\n    </td>\n  </tr>'
+                   for msg in msgs)
+    return ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>选课结果</title>'
+            '<script type="text/javascript">var bg = {};</script></head>\n<body>'
+            f'<div id="container"><table width="100%" class="gridtable">{rows}\n</table></div>'
+            '<script type="text/javascript">window.parent.electCourseTable.update();</script>'
+            '</body></html>')
+
+
+def make_corpus(n: int, seed: int = 0) -> list[str]:
+    rnd = random.Random(seed)
+    return [make_response(rnd.sample(messages, rnd.choice([1, 1, 1, 2, 4]))) for _ in range(n)]
+
+
+# 原先的关键词列表和判断逻辑，不包括需要课程状态的满员百分比重试
+course_fullness_keywords = ['上限', '已满', '已达', '已经达到']
+hard_fail_keywords = ['冲突']
+general_error_keywords = ['失败', '错误', 'fail', 'error', '503', '过快点击', '服务器内部错误']
+
+
+def reference_messages(text: str) -> list[str]:
+    from lxml import etree
+
+    e = etree.HTML(text)
+    rows = [row.xpath('td/div/text()') for row in e.xpath('//table/tr')] if e is not None else []
+    return [row[0].strip() for row in rows if len(row) > 0]
+
+
+def reference_classify(course_id: str, msg: str) -> tuple:
+    for simplified_msg in ['请不要过快点击', '服务器内部错误']:
+        if simplified_msg in msg:
+            msg = simplified_msg
+            break
+    if '已经选过' in msg or '已选上' in msg:
+        return course_id, msg, True, False
+    all_negative_keywords = course_fullness_keywords + hard_fail_keywords + general_error_keywords
+    if not any(keyword in msg for keyword in all_negative_keywords):
+        return course_id, msg, True, False
+    retry = False
+    if any(keyword in msg for keyword in course_fullness_keywords):
+        retry = False
+    elif any(keyword in msg for keyword in hard_fail_keywords):
+        retry = False
+    elif any(keyword in msg for keyword in general_error_keywords):
+        retry = True
+    return course_id, msg, False, retry
+
+
+def run_reference(corpus: list[str]) -> list[list[tuple]]:
+    return [[reference_classify(str(i), msg) for i, msg in enumerate(reference_messages(text))] for text in corpus]
+
+
+def run_classifier(corpus: list[str], c: classifier.Classifier) -> list[list[tuple]]:
+    return [[tuple(c.classify(str(i), msg)[:4]) for i, msg in enumerate(classifier.extract_messages(text))]
+            for text in corpus]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--responses', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.responses)
+    c = classifier.Classifier()
+    expected = run_reference(corpus)
+    actual = run_classifier(corpus, c)
+    mismatches = [(text, e, a) for text, e, a in zip(corpus, expected, actual) if e != a]
+    if mismatches:
+        text, e, a = mismatches[0]
+        sys.exit(f'{len(mismatches)} responses classified differently, e.g.\n{e}\n{a}')
+    print(f'{len(corpus)} responses, {sum(map(len, expected))} messages: results identical')
+
+    for name, func in (('lxml + any', lambda: run_reference(corpus)),
+                       ('classifier', lambda: run_classifier(corpus, c))):
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        print(f'{name:>12}: {best * 1000:>8.1f}ms total, {best / len(corpus) * 1e6:>6.1f}us per response')
+
+
+if __name__ == '__main__':
+    main()
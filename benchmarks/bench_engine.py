@@ -0,0 +1,138 @@
+'''在本地模拟服务器上压测选课引擎。
+
+对逐渐增加的表达式数量，使用线程引擎（或 `--set async_engine=True` 使用异步引擎）统计选课请求吞吐量（elections/sec）、选课请求延迟的 p50/p99
+以及最终选上的课程数。配置以 `envconfig.example.py` 为基础，可以用 `--set` 覆盖任意配置项。
+
+用法（在仓库根目录下运行）：
+
+    python benchmarks/bench_engine.py --counts 1 4 16 64
+    python benchmarks/bench_engine.py --counts 16 --set request_rate=20 --throttle-interval 0.05
+    python benchmarks/bench_engine.py --counts 16 --record capture.sqlite3
+
+`--record` 把选课过程录制为 `capture` 归档，之后可以用 `bench_replay.py` 离线回放。
+'''
+import argparse
+import ast
+import contextlib
+import io
+import os
+import runpy
+import sys
+import threading
+import time
+import types
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_eams import MockConfig, MockEams  # noqa: E402
+
+
+def load_config(overrides: dict) -> types.ModuleType:
+    '''以 `envconfig.example.py` 为基础生成 `envconfig` 模块，必须在导入 `main` 之前调用。'''
+    config = types.ModuleType('envconfig')
+    for name, value in runpy.run_path(os.path.join(root, 'envconfig.example.py')).items():
+        if not name.startswith('__'):
+            setattr(config, name, value)
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    sys.modules['envconfig'] = config
+    return config
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def make_exps(course_ids: list[str], count: int) -> list[str]:
+    '''每个表达式为两门课程的“或”，课程依次取用，表达式之间不重复。'''
+    return [f'{course_ids[(2 * i) % len(course_ids)]}|{course_ids[(2 * i + 1) % len(course_ids)]}'
+            for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--verbose', action='store_true', help='show the output of the engine')
+    parser.add_argument('--record', metavar='PATH', help='record the traffic of each run to a capture archive')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='override an envconfig value, e.g. --set interval=0.1')
+    for name, value in vars(MockConfig()).items():
+        if name not in ('username', 'password', 'election_id'):
+            parser.add_argument(f'--{name.replace("_", "-")}', type=type(value), default=value)
+    args = parser.parse_args()
+
+    mock_config = MockConfig(**{name: getattr(args, name) for name in vars(MockConfig())
+                                if hasattr(args, name)})
+    mock = MockEams(mock_config).start()
+
+    overrides = {'username': mock_config.username, 'password': mock_config.password,
+                 'interval': 0.05, 'threads_interval': 0, 'catalog_ttl': 0}
+    for item in args.set:
+        name, _, value = item.partition('=')
+        try:
+            overrides[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[name] = value
+    load_config(overrides)
+
+    import capture
+    import main as engine
+    from ids import IdsAuth
+
+    class TimedIdsAuth(IdsAuth):
+        '''记录每个选课请求的延迟。'''
+        login_url = f'{mock.url}/authserver/login'
+        check_url = f'{mock.url}/eams/home.action'
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.latencies = []
+            self._latencies_lock = threading.Lock()
+
+        def post(self, url, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().post(url, **kwargs)
+            finally:
+                if 'batchOperator' in url:
+                    with self._latencies_lock:
+                        self.latencies.append(time.perf_counter() - start)
+
+    engine.host = mock.url
+    engine.service = f'{mock.url}/eams/login.action'
+    e_id = mock_config.election_id
+
+    print(f'{"exps":>6}{"posts":>8}{"elect/s":>10}{"p50":>10}{"p99":>10}{"won":>6}{"wall":>9}')
+    for count in args.counts:
+        mock.reset()
+        engine.flights.clear() # 模拟服务器重置后之前选上的课程不再有效
+        engine.ids = TimedIdsAuth()
+        recorder = capture.record(engine.ids, args.record) if args.record else None
+        engine.ids.login(mock_config.username, mock_config.password, engine.service)
+        if not engine.ids.ok:
+            raise SystemExit('Failed to log in to the mock server.')
+        exps_list = make_exps(mock.course_ids, count)
+        catalog = [{'id': int(course_id)} for course_id in mock.course_ids]
+
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        start = time.perf_counter()
+        with output:
+            engine.elect_courses_exps(exps_list, e_id, catalog)
+        wall = time.perf_counter() - start
+        if recorder is not None:
+            recorder.close()
+
+        latencies = engine.ids.latencies
+        print(f'{count:>6}{mock.state.posts:>8}{mock.state.posts / wall:>10.1f}'
+              f'{percentile(latencies, 50) * 1000:>8.1f}ms{percentile(latencies, 99) * 1000:>8.1f}ms'
+              f'{mock.state.won:>6}{wall:>8.2f}s', flush=True)
+    mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+'''比较 `jsliteral` 与原先 `_jsonnet` 解析课程列表和课程状态的耗时。
+
+用法（在仓库根目录下运行）：
+
+    python benchmarks/bench_jsliteral.py --sizes 1000 5000 20000
+
+未安装 jsonnet 时只测试 `jsliteral`。
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jsliteral  # noqa: E402
+
+try:
+    import _jsonnet
+except ImportError:
+    _jsonnet = None
+
+
+def make_lessons(n: int, seed: int = 0) -> str:
+    '''生成与 `stdElectCourse!data.action` 格式相同的课程列表脚本。'''
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        lesson_id = 100000 + i
+        arrange = ','.join(
+            f"{{weekDay:{rnd.randint(1, 7)},weekState:'{'0' + '1' * 16 + '0' * 36}',"
+            f"startUnit:{u},endUnit:{u + 1},weekStateDigest:'1-16',rooms:'A{rnd.randint(100, 599)}'}}"
+            for u in rnd.sample(range(1, 12, 2), rnd.randint(1, 3)))
+        rows.append(
+            f"{{id:{lesson_id},no:'{lesson_id % 9999:04d}',name:'课程\\'{i}\\'名称',"
+            f"code:'C{i:06d}',credits:{rnd.choice([1.0, 2.0, 3.5, 4.0])},courseId:{i},"
+            f"startWeek:1,endWeek:16,courseTypeId:{rnd.randint(1, 30)},courseTypeName:'公共选修课',"
+            f"scheduled:true,hasTextBook:false,period:{rnd.choice([32, 48, 64])},"
+            f"teachers:'教师{rnd.randint(1, 500)},教师{rnd.randint(1, 500)}',campusName:'临港校区',"
+            f"remark:'',arrangeInfo:[{arrange},],expLessonGroups:[],}}")
+    return 'var lessonJSONs = [' + ','.join(rows) + '];'
+
+
+def make_counts(n: int, seed: int = 0) -> str:
+    '''生成与 `stdElectCourse!queryStdCount.action` 格式相同的课程状态脚本。'''
+    rnd = random.Random(seed)
+    rows = ','.join(f"'{100000 + i}':{{sc:{rnd.randint(0, 120)},lc:{rnd.randint(30, 120)}}}"
+                    for i in range(n))
+    return '/*sc 当前人数, lc 人数上限*/\nwindow.lessonId2Counts={' + rows + '}'
+
+
+def parse_jsonnet_array(text: str):
+    dat = text[text.find('['):text.rfind(']') + 1]
+    return json.loads(_jsonnet.evaluate_snippet('snippet', dat))
+
+
+def parse_jsonnet_object(text: str):
+    dat = text[text.find('{'):text.rfind('}') + 1]
+    return json.loads(_jsonnet.evaluate_snippet('snippet', dat))
+
+
+def parse_jsliteral_array(text: str):
+    return list(jsliteral.iter_array(text[text.find('['):text.rfind(']') + 1]))
+
+
+def parse_jsliteral_object(text: str):
+    return jsliteral.loads(text[text.find('{'):text.rfind('}') + 1])
+
+
+def best_of(func, arg, repeat: int) -> tuple[float, object]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cases = [('data.action', make_lessons, parse_jsliteral_array, parse_jsonnet_array),
+             ('queryStdCount', make_counts, parse_jsliteral_object, parse_jsonnet_object)]
+    print(f'{"payload":<14}{"lessons":>9}{"size":>10}{"jsliteral":>12}{"_jsonnet":>12}{"speedup":>9}')
+    for name, make, fast, slow in cases:
+        for n in args.sizes:
+            text = make(n)
+            fast_time, fast_result = best_of(fast, text, args.repeat)
+            if _jsonnet is None:
+                slow_col, speedup = 'n/a', ''
+            else:
+                slow_time, slow_result = best_of(slow, text, args.repeat)
+                if slow_result != fast_result:
+                    raise SystemExit(f'{name} x {n}: results differ between parsers')
+                slow_col, speedup = f'{slow_time * 1000:.1f}ms', f'{slow_time / fast_time:.1f}x'
+            print(f'{name:<14}{n:>9}{len(text) / 1e6:>9.2f}M{fast_time * 1000:>10.1f}ms'
+                  f'{slow_col:>12}{speedup:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+'''用录制的 `capture` 归档离线回放一次选课过程，统计选课引擎的吞吐量和延迟。
+
+不连接任何服务器：登录、课程列表和选课请求的响应都来自归档，响应按录制的耗时
+除以 `--speed` 延迟返回。同一个归档在修改前后各回放一次，即可比较改动对吞吐量和延迟的影响。
+
+用法（在仓库根目录下运行）：
+
+    python benchmarks/bench_engine.py --counts 16 --record capture.sqlite3
+    python benchmarks/bench_replay.py capture.sqlite3 --speed 4
+    python benchmarks/bench_replay.py capture.sqlite3 --exps '100000|100001' '100002' --set batch_window=0.02
+
+默认的选课表达式是归档中出现过的每门课程各一个表达式。
+'''
+import argparse
+import ast
+import contextlib
+import io
+import os
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_engine import load_config, percentile  # noqa: E402
+
+elect_endpoint = 'stdElectCourse!batchOperator.action'
+
+
+def recorded_elections(archive) -> tuple[str | None, list[str]]:
+    '''从归档的选课请求中取出选课轮次ID和全部课程ID（按第一次出现的顺序）。'''
+    e_id = None
+    course_ids = {}
+    rows = archive._conn.execute('SELECT url, request_body FROM exchanges WHERE endpoint = ? ORDER BY started',
+                                 (elect_endpoint,)).fetchall()
+    import zlib
+
+    for url, body in rows:
+        e_id = e_id or parse_qs(urlsplit(url).query).get('profileId', [None])[0]
+        if body:
+            for key, values in parse_qs(zlib.decompress(body).decode()).items():
+                if key.startswith('operator'):
+                    course_ids.setdefault(values[0].split(':')[0], None)
+    return e_id, list(course_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('archive')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed factor')
+    parser.add_argument('--exps', nargs='+', help='course expressions, one per recorded course by default')
+    parser.add_argument('--election-id', help='election id, taken from the archive by default')
+    parser.add_argument('--verbose', action='store_true', help='show the output of the engine')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='override an envconfig value, e.g. --set request_rate=20')
+    args = parser.parse_args()
+
+    overrides = {'interval': 0.05, 'threads_interval': 0, 'catalog_ttl': 0,
+                 'session_check_interval': 0, 'capture_path': ''}
+    for item in args.set:
+        name, _, value = item.partition('=')
+        try:
+            overrides[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[name] = value
+    config = load_config(overrides)
+
+    import capture
+    import main as engine
+    import metrics
+    from ids import IdsAuth
+
+    archive = capture.Archive(args.archive)
+    if archive.count == 0:
+        raise SystemExit('The archive is empty.')
+    for url in archive.urls:
+        path = urlsplit(url).path
+        if path.endswith('/authserver/login'):
+            IdsAuth.login_url = url.split('?')[0]
+        elif path.endswith('/eams/home.action'):
+            IdsAuth.check_url = url
+            engine.host = url[:url.index('/eams/')]
+    engine.service = f'{engine.host}/eams/login.action'
+
+    recorded_e_id, course_ids = recorded_elections(archive)
+    e_id = args.election_id or recorded_e_id
+    exps_list = args.exps or course_ids
+    if not e_id or not exps_list:
+        raise SystemExit('No election requests in the archive, pass --election-id and --exps.')
+
+    engine.ids = IdsAuth()
+    capture.replay(engine.ids, args.archive, args.speed)
+    engine.ids.login(config.username, config.password, engine.service)
+
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with output:
+        results = engine.elect_courses_exps(list(exps_list), e_id)
+    wall = time.perf_counter() - start
+
+    posts = sum(value for labels, value in metrics.request_status.samples() if labels[1] == elect_endpoint)
+    latencies = []
+    for labels, counts, _ in metrics.request_latency.samples():
+        if labels[1] == elect_endpoint:
+            latencies = [metrics.request_latency.quantile(q, counts) for q in (0.5, 0.99)]
+    won = sum(1 for _, result in results if result is not None and result.succeeded)
+    print(f'{archive.count} recorded requests, replayed at {args.speed}x')
+    print(f'{"exps":>6}{"posts":>8}{"elect/s":>10}{"p50":>10}{"p99":>10}{"won":>6}{"wall":>9}')
+    p50, p99 = latencies or (float('nan'), float('nan'))
+    print(f'{len(exps_list):>6}{posts:>8.0f}{posts / wall:>10.1f}{p50 * 1000:>8.1f}ms{p99 * 1000:>8.1f}ms'
+          f'{won:>6}{wall:>8.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+'''测量导入 `main` 的启动耗时，以及导出课程列表的耗时。
+
+启动耗时在新的解释器进程中测量，`envconfig` 使用 `envconfig.example.py`，
+同时给出空解释器的耗时作为基准。导出部分比较 `exporter` 与 pandas（已安装时）。
+
+用法（在仓库根目录下运行）：
+
+    python benchmarks/bench_startup.py --repeat 10 --importtime
+    python benchmarks/bench_startup.py --sizes 1000 5000
+'''
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import exporter  # noqa: E402
+import jsliteral  # noqa: E402
+from bench_jsliteral import make_lessons  # noqa: E402
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+def time_command(code: str, cwd: str, env: dict, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def print_importtime(cwd: str, env: dict, top: int = 15):
+    '''打印累计耗时最多的模块。'''
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                          cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f'  {cumulative / 1000:>8.1f}ms {name}')
+
+
+def bench_export(sizes: list[int], repeat: int):
+    print(f'{"courses":>8}{"format":>8}{"exporter":>12}{"pandas":>12}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            dat = make_lessons(n)
+            courses = list(jsliteral.iter_array(dat[dat.find('['):dat.rfind(']') + 1]))
+            for fmt in exporter.formats:
+                path = os.path.join(tmp, f'courses.{fmt}')
+                best = min(_timed(lambda: exporter.export(courses, path, fmt)) for _ in range(repeat))
+                pandas_best = float('nan')
+                if pd is not None:
+                    def with_pandas():
+                        df = pd.DataFrame(courses)
+                        if fmt == 'tsv':
+                            df.to_csv(path, sep='\t', index=False)
+                        else:
+                            df.to_excel(path, index=False)
+                    pandas_best = min(_timed(with_pandas) for _ in range(repeat))
+                print(f'{n:>8}{fmt:>8}{best * 1000:>10.1f}ms{pandas_best * 1000:>10.1f}ms')
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--importtime', action='store_true', help='show the slowest imports')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1000],
+                        help='course counts for the export benchmark')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy(os.path.join(root, 'envconfig.example.py'), os.path.join(tmp, 'envconfig.py'))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([tmp, root]), PYTHONDONTWRITEBYTECODE='1')
+        # 先运行一次，让 root 下的模块生成字节码缓存
+        time_command('import main', tmp, dict(env, PYTHONDONTWRITEBYTECODE=''), 1)
+        baseline = time_command('pass', tmp, env, args.repeat)
+        startup = time_command('import main', tmp, env, args.repeat)
+        print(f'python -c pass     median {statistics.median(baseline) * 1000:>7.1f}ms  '
+              f'min {min(baseline) * 1000:>7.1f}ms')
+        print(f'python -c "import main" median {statistics.median(startup) * 1000:>7.1f}ms  '
+              f'min {min(startup) * 1000:>7.1f}ms')
+        if args.importtime:
+            print_importtime(tmp, env)
+
+    if args.sizes:
+        bench_export(args.sizes, max(1, args.repeat // 5))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+'''本地模拟的统一身份认证（IDS）和教务系统（EAMS）服务器。
+
+模拟 `authserver/login`、`home.action`、`stdElectCourse!innerIndex.action`、
+`defaultPage.action`、`data.action`、`queryStdCount.action` 和 `batchOperator.action`，
+可以配置响应延迟、课容量、限流、服务器错误率和会话过期时间，用于在选课时间以外测试和压测。
+
+单独运行：
+
+    python benchmarks/mock_eams.py --port 8000 --courses 200
+'''
+import argparse
+import random
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass
+class MockConfig:
+    username: str = '12345678'
+    password: str = 'password'
+    election_id: str = '1000'
+    courses: int = 200  # 课程数量，课程ID从 100000 开始
+    capacity: int = 30  # 每门课程的课容量
+    initially_selected: float = 0.9  # 开始时每门课程已选人数占课容量的比例
+    latency: float = 0.02  # 每个请求的平均处理时间（秒）
+    jitter: float = 0.01  # 处理时间的随机波动（秒）
+    throttle_interval: float = 0.0  # 同一会话两次选课请求的最小间隔（秒），过快时提示“请不要过快点击”
+    error_rate: float = 0.0  # 选课请求返回 503 的概率
+    session_ttl: float = 0.0  # 会话有效期（秒），0 表示不过期
+    release_rate: float = 0.0  # 每秒随机退课释放的名额数
+    seed: int = 0
+
+
+@dataclass
+class MockState:
+    selected: dict = field(default_factory=dict)  # 课程ID -> 已选人数
+    elected: dict = field(default_factory=dict)  # 会话 -> 已选上的课程ID集合
+    sessions: dict = field(default_factory=dict)  # 会话 -> 登录时间
+    last_post: dict = field(default_factory=dict)  # 会话 -> 上次选课请求时间
+    posts: int = 0  # 收到的选课请求数
+    operators: int = 0  # 收到的 operatorN 总数
+    won: int = 0  # 成功选上的课程数
+
+
+def _page(body: str) -> bytes:
+    return f'<html><head><meta charset="utf-8"></head><body>{body}</body></html>'.encode()
+
+
+def _result_table(msgs: list[str]) -> bytes:
+    rows = ''.join(f'<tr><td><div>{msg}</div></td></tr>' for msg in msgs)
+    return _page(f'<table>{rows}</table>')
+
+
+class MockEams:
+    '''在后台线程中运行的模拟服务器。'''
+
+    def __init__(self, config: MockConfig | None = None, port: int = 0):
+        self.config = config or MockConfig()
+        self.rnd = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self.reset()
+        handler = type('Handler', (_Handler,), {'mock': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def course_ids(self) -> list[str]:
+        return [str(100000 + i) for i in range(self.config.courses)]
+
+    def reset(self):
+        '''恢复初始的课程人数，清空会话和统计数据。'''
+        c = self.config
+        with self.lock:
+            self.state = MockState()
+            for course_id in self.course_ids:
+                self.state.selected[course_id] = int(c.capacity * c.initially_selected)
+            self._released_at = time.monotonic()
+
+    def start(self) -> 'MockEams':
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _release_seats(self):
+        # 按 release_rate 随机释放名额，模拟其他学生退课
+        c = self.config
+        now = time.monotonic()
+        n = int((now - self._released_at) * c.release_rate)
+        if n <= 0:
+            return
+        self._released_at = now
+        for course_id in self.rnd.sample(self.course_ids, min(n, len(self.course_ids))):
+            if self.state.selected[course_id] > 0:
+                self.state.selected[course_id] -= 1
+
+    def session_valid(self, token: str | None) -> bool:
+        login_time = self.state.sessions.get(token)
+        if login_time is None:
+            return False
+        return self.config.session_ttl <= 0 or time.monotonic() - login_time < self.config.session_ttl
+
+    def elect(self, token: str, course_ids: list[str]) -> list[str]:
+        c = self.config
+        with self.lock:
+            self.state.posts += 1
+            self.state.operators += len(course_ids)
+            if not self.session_valid(token):
+                return ['会话已经被过期，请重新登录']
+            now = time.monotonic()
+            last = self.state.last_post.get(token, 0.0)
+            self.state.last_post[token] = now
+            if now - last < c.throttle_interval:
+                return ['请不要过快点击']
+            self._release_seats()
+            elected = self.state.elected.setdefault(token, set())
+            msgs = []
+            for course_id in course_ids:
+                if course_id not in self.state.selected:
+                    msgs.append(f'{course_id} 选课失败：课程不存在')
+                elif course_id in elected:
+                    msgs.append(f'{course_id} 已经选过')
+                elif self.state.selected[course_id] >= c.capacity:
+                    msgs.append(f'{course_id} 选课失败：已经达到上限')
+                else:
+                    self.state.selected[course_id] += 1
+                    elected.add(course_id)
+                    self.state.won += 1
+                    msgs.append(f'{course_id} 选课成功')
+            return msgs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock: MockEams
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay(self):
+        c = self.mock.config
+        time.sleep(max(0.0, c.latency + self.mock.rnd.uniform(-c.jitter, c.jitter)))
+
+    def _token(self) -> str | None:
+        for item in self.headers.get('Cookie', '').split(';'):
+            name, _, value = item.strip().partition('=')
+            if name == 'JSESSIONID':
+                return value
+        return None
+
+    def _send(self, status: int, body: bytes = b'', headers: dict | None = None, head: bool = False):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _read_form(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head: bool = False):
+        mock = self.mock
+        path = urlsplit(self.path).path
+        if path == '/authserver/login':
+            form = ('<form method="post"><input name="lt" value="LT-1"/>'
+                    '<input name="execution" value="e1s1"/><input name="_eventId" value="submit"/>'
+                    '<input name="username"/><input name="password"/></form>')
+            return self._send(200, _page(form), head=head)
+        with mock.lock:
+            valid = mock.session_valid(self._token())
+        if not valid:
+            return self._send(302, headers={'Location': '/authserver/login'}, head=head)
+        self._delay()
+        if path == '/eams/home.action':
+            return self._send(200, _page('home'), head=head)
+        if path == '/eams/stdElectCourse!innerIndex.action':
+            e_id = mock.config.election_id
+            body = (f'<div class="ajax_container"><div><h2>模拟选课轮次</h2>'
+                    f'<div><a href="/eams/stdElectCourse!defaultPage.action?electionProfile.id={e_id}">进入</a>'
+                    f'</div></div></div>')
+            return self._send(200, _page(body), head=head)
+        if path == '/eams/stdElectCourse!defaultPage.action':
+            script = '/eams/stdElectCourse!queryStdCount.action?projectId=1&semesterId=1'
+            return self._send(200, _page(f'<script id="qr_script" src="{script}"></script>'), head=head)
+        if path == '/eams/stdElectCourse!data.action':
+            lessons = ','.join(
+                f"{{id:{course_id},no:'{course_id[-4:]}',name:'模拟课程{course_id}',"
+                f"teachers:'教师{int(course_id) % 97}',credits:2.0,"
+                f"arrangeInfo:[{{weekDay:{int(course_id) % 7 + 1},weekState:'0{'1' * 16}',"
+                f"startUnit:{int(course_id) % 5 * 2 + 1},endUnit:{int(course_id) % 5 * 2 + 2}}}],}}"
+                for course_id in mock.course_ids)
+            return self._send(200, f'var lessonJSONs = [{lessons}];'.encode(), head=head)
+        if path == '/eams/stdElectCourse!queryStdCount.action':
+            with mock.lock:
+                mock._release_seats()
+                counts = ','.join(f"'{course_id}':{{sc:{sc},lc:{mock.config.capacity}}}"
+                                  for course_id, sc in mock.state.selected.items())
+            return self._send(200, f'window.lessonId2Counts={{{counts}}}'.encode(), head=head)
+        return self._send(404, b'', head=head)
+
+    def do_POST(self):
+        mock = self.mock
+        path = urlsplit(self.path).path
+        form = self._read_form()
+        if path == '/authserver/login':
+            if form.get('username') != mock.config.username or form.get('password') != mock.config.password:
+                return self._send(200, _page('用户名或密码错误'))
+            token = secrets.token_hex(8)
+            with mock.lock:
+                mock.state.sessions[token] = time.monotonic()
+            return self._send(200, _page('ok'), {'Set-Cookie': f'JSESSIONID={token}; Path=/'})
+        if path == '/eams/stdElectCourse!batchOperator.action':
+            self._delay()
+            if mock.rnd.random() < mock.config.error_rate:
+                return self._send(503, b'Service Unavailable')
+            operators = sorted((int(k[len('operator'):]), v) for k, v in form.items() if k.startswith('operator'))
+            course_ids = [v.split(':')[0] for _, v in operators]
+            return self._send(200, _result_table(mock.elect(self._token(), course_ids)))
+        return self._send(404)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local mock IDS/EAMS server.')
+    parser.add_argument('--port', type=int, default=8000)
+    for name, value in vars(MockConfig()).items():
+        parser.add_argument(f'--{name.replace("_", "-")}', type=type(value), default=value)
+    args = vars(parser.parse_args())
+    port = args.pop('port')
+    mock = MockEams(MockConfig(**args), port)
+    print(f'Mock IDS/EAMS listening on {mock.url}')
+    mock.server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
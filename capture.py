@@ -0,0 +1,292 @@
+'''HTTP 流量的录制与回放，用于离线复现选课过程并比较性能。
+
+录制时 `IdsAuth` 的每个请求和响应（包括耗时和网络错误）都写入一个 SQLite 归档，
+响应体用 zlib 压缩，写入在后台线程中批量完成，不增加请求的延迟。登录表单只保存哈希，
+`Set-Cookie` 和 `Cookie` 头只保留 cookie 名称和属性，值替换为哈希，归档中没有可以直接使用的会话凭据。
+
+回放时用 `ReplayAdapter` 代替真实的连接池：按 (方法, URL, 请求体) 查找录制的响应，
+同一个请求录制了多次时，取录制时间不晚于当前回放进度的最后一次，
+因此更快的代码会更早看到服务器后来的状态（例如课程已满）。响应按录制的耗时除以
+`speed` 延迟返回，`speed` 为 1 时保持原速，大于 1 时加速。
+
+用法：
+
+    python capture.py summary capture.sqlite3
+'''
+import argparse
+import bisect
+import hashlib
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+import metrics
+from ids import IdsAuth, KeepAliveAdapter
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS exchanges (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    body_hash TEXT NOT NULL,
+    request_body BLOB,
+    status INTEGER,
+    headers TEXT,
+    body BLOB,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS exchanges_request ON exchanges (method, url, body_hash, started);
+CREATE INDEX IF NOT EXISTS exchanges_endpoint ON exchanges (endpoint, started);
+'''
+
+
+def _body_bytes(body) -> bytes:
+    if body is None:
+        return b''
+    return body.encode() if isinstance(body, str) else bytes(body)
+
+
+def _body_hash(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=8).hexdigest() if body else ''
+
+
+# 头中每个 cookie 的 `名称=值`：合并后的 `Set-Cookie` 中 cookie 之间用逗号分隔，分号后是 Path 等属性，
+# `Expires=Wed, 21 Oct ...` 中逗号后的日期没有等号，不会被误认为新的 cookie；`Cookie` 中用分号分隔
+_cookie_res = {
+    'set-cookie': re.compile(r'(^|,\s*)([^=;,\s]+)=([^;,]*)'),
+    'cookie': re.compile(r'(^|;\s*)([^=;\s]+)=([^;]*)'),
+}
+
+
+def _redact_headers(headers) -> dict:
+    '''把 `Set-Cookie` 和 `Cookie` 头中的 cookie 值替换为哈希，其他头原样保留。'''
+    redacted = {}
+    for key, value in headers.items():
+        cookie_re = _cookie_res.get(key.lower())
+        if cookie_re is not None:
+            value = cookie_re.sub(lambda m: f'{m.group(1)}{m.group(2)}=<{_body_hash(m.group(3).encode())}>', value)
+        redacted[key] = value
+    return redacted
+
+
+def _open(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(_schema)
+    return conn
+
+
+class Recorder:
+    '''把请求和响应写入归档。
+
+    Args:
+        path (str): 归档文件路径，已存在时追加。
+        flush_interval (float, optional): 后台线程批量写入的间隔（秒）。Defaults to 0.5.
+    '''
+
+    def __init__(self, path: str, flush_interval: float = 0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._stopped = threading.Event()
+        # 录制时刻都是相对于 `_epoch` 的秒数，回放时按同样的相对时间对齐
+        self._epoch = time.monotonic()
+        conn = _open(path)
+        conn.execute('INSERT OR IGNORE INTO meta VALUES (?, ?)', ('created_at', str(time.time())))
+        conn.commit()
+        conn.close()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='capture')
+        self._thread.start()
+
+    def record(self, started: float, duration: float, request: requests.PreparedRequest,
+               response: requests.Response | None = None, error: Exception | None = None):
+        body = _body_bytes(request.body)
+        # 登录表单中有明文密码，只保存哈希用于回放时匹配
+        stored_body = zlib.compress(body) if body and b'password=' not in body else None
+        row = (started - self._epoch, duration, request.method, request.url,
+               metrics.endpoint_name(request.url), _body_hash(body), stored_body,
+               None if response is None else response.status_code,
+               None if response is None else json.dumps(_redact_headers(response.headers)),
+               None if response is None else zlib.compress(response.content),
+               None if error is None else f'{type(error).__name__}: {error}')
+        self._queue.put(row)
+
+    def _flush(self, conn: sqlite3.Connection):
+        rows = []
+        try:
+            while True:
+                rows.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        if rows:
+            conn.executemany('INSERT INTO exchanges (started, duration, method, url, endpoint, body_hash, '
+                             'request_body, status, headers, body, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             rows)
+            conn.commit()
+
+    def _run(self):
+        conn = _open(self.path)
+        while not self._stopped.wait(self.flush_interval):
+            self._flush(conn)
+        self._flush(conn)
+        conn.close()
+
+    def close(self):
+        '''写入所有已录制的请求并停止后台线程。'''
+        self._stopped.set()
+        self._thread.join()
+
+
+class RecordingAdapter(KeepAliveAdapter):
+    '''发送真实请求，同时把请求和响应交给 `Recorder`。'''
+
+    def __init__(self, recorder: Recorder, *args, **kwargs):
+        self.recorder = recorder
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        try:
+            response = super().send(request, **kwargs)
+            if not kwargs.get('stream'):
+                response.content # 读完响应体，耗时包括传输时间
+        except requests.RequestException as e:
+            self.recorder.record(started, time.monotonic() - started, request, error=e)
+            raise
+        self.recorder.record(started, time.monotonic() - started, request, response)
+        return response
+
+
+class Archive:
+    '''只读地加载归档，按请求查找录制的响应。'''
+
+    def __init__(self, path: str):
+        conn = _open(path)
+        rows = conn.execute('SELECT id, started, method, url, body_hash FROM exchanges ORDER BY started').fetchall()
+        self._conn = conn
+        self._lock = threading.Lock()
+        # (方法, URL, 请求体哈希) 和 (方法, URL) -> 按录制时刻排序的 [(started, id)]
+        self._index: dict[tuple, list[tuple[float, int]]] = {}
+        for exchange_id, started, method, url, body_hash in rows:
+            self._index.setdefault((method, url, body_hash), []).append((started, exchange_id))
+            self._index.setdefault((method, url), []).append((started, exchange_id))
+        self.count = len(rows)
+        self.urls = sorted({row[3] for row in rows})
+
+    def find(self, method: str, url: str, body: bytes, at: float) -> tuple | None:
+        '''返回录制时刻不晚于 `at` 的最后一次同样请求的 (duration, status, headers, body, error)；
+        请求体不同时退回到只匹配方法和URL，都找不到时返回 None。'''
+        entries = self._index.get((method, url, _body_hash(body))) or self._index.get((method, url))
+        if not entries:
+            return None
+        i = max(0, bisect.bisect_right(entries, (at, float('inf'))) - 1)
+        with self._lock:
+            duration, status, headers, content, error = self._conn.execute(
+                'SELECT duration, status, headers, body, error FROM exchanges WHERE id = ?',
+                (entries[i][1],)).fetchone()
+        return duration, status, json.loads(headers) if headers else {}, \
+            zlib.decompress(content) if content else b'', error
+
+
+class ReplayAdapter(BaseAdapter):
+    '''从归档中返回响应的传输层，不发送任何网络请求。
+
+    Args:
+        archive (Archive): 录制的归档。
+        speed (float, optional): 回放速度，响应延迟为录制耗时除以 `speed`，
+            回放进度按同样的倍数推进。Defaults to 1.0.
+        clock (Callable[[], float], optional): 回放开始后经过的秒数，同一次回放的所有适配器应共用。
+    '''
+
+    def __init__(self, archive: Archive, speed: float = 1.0, clock=None, **kwargs):
+        super().__init__()
+        self.archive = archive
+        self.speed = speed
+        if clock is None:
+            start = time.monotonic()
+            clock = lambda: time.monotonic() - start
+        self.clock = clock
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        found = self.archive.find(request.method, request.url, _body_bytes(request.body),
+                                  self.clock() * self.speed)
+        if found is None:
+            raise requests.ConnectionError(f'No recorded response for {request.method} {request.url}',
+                                           request=request)
+        duration, status, headers, content, error = found
+        time.sleep(duration / self.speed)
+        if error is not None:
+            raise requests.ConnectionError(f'Recorded error: {error}', request=request)
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+def record(ids: IdsAuth, path: str) -> Recorder:
+    '''开始录制 `ids` 发送的所有请求，返回的 `Recorder` 在结束时应调用 `close`。'''
+    recorder = Recorder(path)
+    ids.set_transport(lambda **kwargs: RecordingAdapter(recorder, **kwargs))
+    return recorder
+
+
+def replay(ids: IdsAuth, path: str, speed: float = 1.0) -> Archive:
+    '''让 `ids` 从归档 `path` 回放响应，回放进度从调用时开始计算。
+
+    回放的响应不带 cookies，依赖登录状态的检查只看录制的状态码。
+    '''
+    archive = Archive(path)
+    start = time.monotonic()
+    clock = lambda: time.monotonic() - start
+    ids.set_transport(lambda **kwargs: ReplayAdapter(archive, speed, clock, **kwargs))
+    return archive
+
+
+def summary(path: str):
+    '''按接口打印归档中的请求数、错误数和耗时分位数。'''
+    conn = _open(path)
+    rows = conn.execute('SELECT endpoint, duration, status, error FROM exchanges').fetchall()
+    span = conn.execute('SELECT MIN(started), MAX(started + duration) FROM exchanges').fetchone()
+    by_endpoint: dict[str, list] = {}
+    for endpoint, duration, status, error in rows:
+        by_endpoint.setdefault(endpoint, []).append((duration, status, error))
+    print(f'{len(rows)} requests over {(span[1] or 0) - (span[0] or 0):.1f}s')
+    print(f'{"endpoint":<45}{"count":>7}{"errors":>8}{"p50":>10}{"p99":>10}')
+    for endpoint, items in sorted(by_endpoint.items(), key=lambda item: -len(item[1])):
+        durations = sorted(duration for duration, _, _ in items)
+        errors = sum(1 for _, status, error in items if error is not None or status >= 500)
+        p50 = durations[len(durations) // 2]
+        p99 = durations[min(len(durations) - 1, int(len(durations) * 0.99))]
+        print(f'{endpoint:<45}{len(items):>7}{errors:>8}{p50 * 1000:>8.1f}ms{p99 * 1000:>8.1f}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspect recorded HTTP traffic.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    summary_parser = subparsers.add_parser('summary', help='per-endpoint counts and latencies')
+    summary_parser.add_argument('path')
+    args = parser.parse_args()
+    if args.command == 'summary':
+        summary(args.path)
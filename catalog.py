@@ -0,0 +1,111 @@
+'''保存在本地 SQLite 数据库中的课程目录缓存。
+
+课程列表和学期信息在一个选课阶段内几乎不变，却要在服务器最繁忙的时候反复下载和解析。
+这里把解析后的结果以 JSON 保存到磁盘：缓存未过期时直接读取；过期后带上 `If-None-Match` /
+`If-Modified-Since` 重新验证，服务器返回 304 时只刷新时间戳；请求失败时退回使用过期的缓存。
+'''
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable
+
+import requests
+
+
+class CatalogCache:
+    '''按键保存解析结果的磁盘缓存，多个线程和进程可以共用同一个数据库文件。
+
+    Args:
+        path (str): SQLite 数据库文件路径。
+        ttl (float): 缓存的有效期（秒），过期后需要向服务器重新验证。
+    '''
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # 第一次使用时才打开数据库，导入 main 时不产生磁盘IO
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                         'etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def load(self, key: str) -> tuple[Any, str | None, str | None, float] | None:
+        '''返回 (value, etag, last_modified, fetched_at)，没有缓存时返回 None。'''
+        with self._lock:
+            row = self._db.execute('SELECT value, etag, last_modified, fetched_at FROM entries WHERE key = ?',
+                                   (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2], row[3]
+
+    def store(self, key: str, value: Any, etag: str | None = None, last_modified: str | None = None):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                             (key, json.dumps(value, ensure_ascii=False), etag, last_modified, time.time()))
+            self._db.commit()
+
+    def touch(self, key: str):
+        '''服务器确认缓存仍然有效，刷新获取时间。'''
+        with self._lock:
+            self._db.execute('UPDATE entries SET fetched_at = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+
+    def invalidate(self, prefix: str = ''):
+        '''删除键以 `prefix` 开头的缓存，默认全部删除。'''
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE substr(key, 1, length(?)) = ?", (prefix, prefix))
+            self._db.commit()
+
+    def get(self, key: str, request: Callable[[dict], requests.Response],
+            parse: Callable[[requests.Response], Any]) -> Any:
+        '''读取缓存，缓存不存在或已过期时请求服务器。
+
+        Args:
+            key (str): 缓存键，例如 `courses:<选课轮次ID>`。
+            request (Callable[[dict], requests.Response]): 发送请求，参数是需要附加的条件请求头。
+            parse (Callable[[requests.Response], Any]): 解析响应，响应无效时应抛出异常。
+                返回值必须可以序列化为 JSON。
+
+        Returns:
+            Any: 解析结果。
+
+        Raises:
+            Exception: 请求或解析失败，并且没有可用的缓存。
+        '''
+        entry = self.load(key)
+        if entry is not None and time.time() - entry[3] < self.ttl:
+            return entry[0]
+
+        conditional = {}
+        if entry is not None:
+            if entry[1]:
+                conditional['If-None-Match'] = entry[1]
+            if entry[2]:
+                conditional['If-Modified-Since'] = entry[2]
+        try:
+            resp = request(conditional)
+            if resp.status_code == 304 and entry is not None:
+                self.touch(key)
+                return entry[0]
+            value = parse(resp)
+        except Exception as e:
+            if entry is None:
+                raise
+            print(f'[Warning] Failed to refresh {key}, using cached data: {e}')
+            return entry[0]
+        # 空结果通常说明会话已失效或选课轮次尚未开放，不写入缓存，有旧缓存时继续使用旧缓存
+        if not value:
+            return value if entry is None else entry[0]
+        self.store(key, value, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+        return value
@@ -0,0 +1,112 @@
+'''选课进度的检查点，进程重启后从中断的位置继续。
+
+每门课程得到最终结果（成功，或不再重试的失败）以及每个表达式结束时，向 JSONL 文件
+追加一行并 fsync，进程在任何时刻退出都最多丢失正在写入的一行。重启后：
+
+- 已有最终结果的课程直接使用记录的结果，不再发送选课请求；
+- 已经结束的表达式直接返回记录的结果；
+- 未结束的表达式重新求值，`&`、`|`、`;` 会依次跳过已有结果的课程，
+  停在第一门没有结果的课程上，与中断前的进度一致。
+
+记录按学号和选课轮次ID区分，换用其他账号时不会沿用上一个账号的结果；没有学号的旧记录会被忽略。
+要重新开始某个轮次时删除检查点文件即可。
+'''
+import json
+import os
+import threading
+
+from classifier import ElectResult, Outcome
+
+
+def _result_record(result: ElectResult) -> dict:
+    return {'course_id': result.course_id, 'msg': result.msg,
+            'succeeded': result.succeeded, 'outcome': str(result.outcome)}
+
+
+def _restore(record: dict) -> ElectResult:
+    return ElectResult(record['course_id'], record['msg'], record['succeeded'], False, Outcome(record['outcome']))
+
+
+class Checkpoint:
+    '''只追加的检查点文件。
+
+    Args:
+        path (str): JSONL 文件路径，不存在时在第一次写入时创建。
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._courses: dict[tuple[str, str, str], ElectResult] = {}
+        self._plans: dict[tuple[str, str, str], ElectResult] = {}
+        self._loaded = False
+
+    def _load(self):
+        # 第一次使用时才读取文件，导入 main 时不产生磁盘IO
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    key = (record['username'], record['e_id'], record['key'])
+                    result = _restore(record['result'])
+                except (ValueError, KeyError, TypeError):
+                    continue # 进程在写入时退出留下的不完整的一行
+                (self._courses if record['type'] == 'course' else self._plans)[key] = result
+
+    def _append(self, record: dict):
+        if self._file is None:
+            self._file = open(self.path, 'a+', encoding='utf-8')
+            # 上次写入被中断时文件不以换行结尾，先补上换行，避免新记录与残缺的一行连在一起
+            if self._file.tell() > 0:
+                self._file.seek(self._file.tell() - 1)
+                if self._file.read(1) != '\n':
+                    self._file.write('\n')
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def course_result(self, username: str, e_id: str, course_id: str) -> ElectResult | None:
+        '''账号 `username` 的课程已记录的最终结果，没有时返回 None。'''
+        with self._lock:
+            self._load()
+            return self._courses.get((str(username), str(e_id), str(course_id)))
+
+    def plan_result(self, username: str, e_id: str, exp: str) -> ElectResult | None:
+        '''账号 `username` 的表达式已记录的最终结果，没有时返回 None。'''
+        with self._lock:
+            self._load()
+            return self._plans.get((str(username), str(e_id), exp))
+
+    def elected(self, username: str, e_id: str) -> list[str]:
+        '''账号 `username` 已记录为选上的课程ID。'''
+        with self._lock:
+            self._load()
+            return [course_id for (key_username, key_e_id, course_id), result in self._courses.items()
+                    if key_username == str(username) and key_e_id == str(e_id) and result.succeeded]
+
+    def record_course(self, username: str, e_id: str, result: ElectResult):
+        self._record('course', str(username), str(e_id), str(result.course_id), result, self._courses)
+
+    def record_plan(self, username: str, e_id: str, exp: str, result: ElectResult):
+        self._record('plan', str(username), str(e_id), exp, result, self._plans)
+
+    def _record(self, kind: str, username: str, e_id: str, key: str, result: ElectResult, table: dict):
+        with self._lock:
+            self._load()
+            if table.get((username, e_id, key)) == result._replace(retry=False):
+                return
+            self._append({'type': kind, 'username': username, 'e_id': e_id, 'key': key,
+                          'result': _result_record(result)})
+            table[(username, e_id, key)] = _restore(_result_record(result))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
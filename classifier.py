@@ -0,0 +1,129 @@
+'''选课响应的分类。
+
+`batchOperator.action` 的响应是一个完整的HTML页面，每个 operatorN 的结果位于表格一行的
+`<td><div>消息</div></td>` 中。这里先用正则表达式直接取出这些消息，只有取不到时才退回到
+lxml 解析整个页面；再用所有关键词编译成的一个正则表达式扫描一遍消息，按规则表的顺序
+决定结果类别，代替对每组关键词分别做 `any(keyword in msg ...)`。
+
+规则表可以替换：`Classifier` 接受任意 `Rule` 列表，排在前面的规则优先。
+'''
+import html
+import re
+from enum import StrEnum
+from typing import NamedTuple
+
+
+class Outcome(StrEnum):
+    '''选课尝试的结果类别，值同时用作指标的标签。'''
+    SUCCESS = 'success'
+    FULL = 'full'
+    CONFLICT = 'conflict'
+    THROTTLED = 'throttled'
+    EXPIRED = 'expired'
+    SERVER_ERROR = 'server_error'
+    ERROR = 'error'
+
+    @property
+    def succeeded(self) -> bool:
+        return self is Outcome.SUCCESS
+
+
+class ElectResult(NamedTuple):
+    '''一门课程一次选课尝试的结果。
+
+    前四项与原先的 `[course_id, message, succeeded, retry]` 列表一致，仍然可以按下标访问。
+    '''
+    course_id: str
+    msg: str
+    succeeded: bool
+    retry: bool
+    outcome: Outcome
+
+
+class Rule(NamedTuple):
+    '''消息包含 `keywords` 中任意一个时归入 `outcome`。
+
+    Args:
+        outcome (Outcome): 结果类别。
+        keywords (tuple[str, ...]): 关键词，区分大小写。
+        retry (bool): 是否值得重试。课程已满时是否重试由调用方根据课程余量决定。
+        message (str | None): 不为 None 时用它代替原始消息，用于简化冗长的提示。
+    '''
+    outcome: Outcome
+    keywords: tuple[str, ...]
+    retry: bool
+    message: str | None = None
+
+
+# 默认规则，顺序即优先级：例如“选课失败：已经达到上限”同时包含“失败”和“上限”，归入课程已满
+default_rules = [
+    Rule(Outcome.SUCCESS, ('已经选过', '已选上'), False),
+    Rule(Outcome.FULL, ('上限', '已满', '已达', '已经达到'), False),
+    Rule(Outcome.CONFLICT, ('冲突',), False),  # 例如选课时间冲突，通常不可通过重试解决
+    Rule(Outcome.THROTTLED, ('过快点击',), True, '请不要过快点击'),
+    Rule(Outcome.SERVER_ERROR, ('服务器内部错误',), True, '服务器内部错误'),
+    Rule(Outcome.SERVER_ERROR, ('503',), True),
+    Rule(Outcome.ERROR, ('失败', '错误', 'fail', 'error'), True),
+]
+
+# 结果表格中一行的消息：<tr><td><div>消息</div></td></tr>
+_row_re = re.compile(r'<tr[^>]*>\s*<td[^>]*>\s*<div[^>]*>([^<]*)<', re.IGNORECASE)
+
+
+def extract_messages(text: str) -> list[str]:
+    '''取出结果表格中每一行的消息，与 lxml 的 `//table/tr` → `td/div/text()` 结果一致。
+
+    正则表达式取不到时退回到 lxml 解析，仍然取不到时返回空列表。
+    '''
+    msgs = [m.strip() for m in _row_re.findall(text)]
+    msgs = [html.unescape(m) if '&' in m else m for m in msgs if m.strip()]
+    if msgs:
+        return msgs
+
+    from lxml import etree
+
+    e = etree.HTML(text)
+    rows = [row.xpath('td/div/text()') for row in e.xpath('//table/tr')] if e is not None else []
+    return [row[0].strip() for row in rows if len(row) > 0]
+
+
+class Classifier:
+    '''按规则表对选课消息分类。
+
+    Args:
+        rules (list[Rule], optional): 规则表，排在前面的优先。Defaults to `default_rules`.
+    '''
+
+    def __init__(self, rules: list[Rule] | None = None):
+        self.rules = list(default_rules if rules is None else rules)
+        # 关键词 -> 规则序号，同一关键词出现在多条规则中时取第一条
+        self._rule_of: dict[str, int] = {}
+        for i, rule in enumerate(self.rules):
+            for keyword in rule.keywords:
+                self._rule_of.setdefault(keyword, i)
+        # 同一位置有多个关键词时正则表达式选择排在前面的分支，因此按规则优先级排列；
+        # 用零宽的先行断言匹配，关键词之间互相重叠（例如“已达”与“已经达到”）时也不会漏掉
+        keywords = sorted(self._rule_of, key=lambda keyword: (self._rule_of[keyword], -len(keyword)))
+        self._pattern = re.compile('(?=(' + '|'.join(map(re.escape, keywords)) + '))') if keywords else None
+
+    def match(self, msg: str) -> Rule | None:
+        '''返回消息命中的优先级最高的规则，没有命中任何关键词时返回 None。'''
+        if self._pattern is None:
+            return None
+        best = None
+        for m in self._pattern.finditer(msg):
+            i = self._rule_of[m.group(1)]
+            if best is None or i < best:
+                best = i
+                if best == 0:
+                    break
+        return None if best is None else self.rules[best]
+
+    def classify(self, course_id: str, msg: str) -> ElectResult:
+        '''对一条消息分类。没有命中任何关键词的消息视为成功，与原先的判断一致。'''
+        rule = self.match(msg)
+        if rule is None:
+            return ElectResult(course_id, msg, True, False, Outcome.SUCCESS)
+        if rule.message is not None:
+            msg = rule.message
+        return ElectResult(course_id, msg, rule.outcome.succeeded, rule.retry, rule.outcome)
@@ -0,0 +1,74 @@
+'''服务器时钟同步与定时启动。
+
+HTTP 响应的 `Date` 头只精确到秒。每次探测得到的服务器时间 D 说明：在本地发出请求到收到响应
+之间的某个时刻，服务器时间位于 [D, D+1) 内，由此得到时钟偏差的一个区间。多次探测的区间取交集，
+并把下一次探测安排在预计的服务器整秒跳变时刻附近，每次探测大约可以把不确定范围缩小一半。
+'''
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable
+
+# 教务系统使用北京时间
+server_timezone = timezone(timedelta(hours=8))
+
+
+def parse_start_time(value: str) -> float:
+    '''把 `YYYY-MM-DD HH:MM:SS[.fff]` 格式的北京时间转换为 Unix 时间戳。'''
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=server_timezone)
+    return dt.timestamp()
+
+
+def estimate_offset(probe: Callable[[], str | None], samples: int = 8) -> tuple[float, float]:
+    '''估计服务器时钟与本地时钟的偏差。
+
+    Args:
+        probe (Callable[[], str | None]): 发送一次请求并返回响应的 `Date` 头。
+        samples (int, optional): 探测次数。Defaults to 8.
+
+    Returns:
+        tuple[float, float]: (offset, error)，服务器时间 ≈ `time.time() + offset`，
+            误差不超过 error 秒。
+
+    Raises:
+        Exception: 所有探测都没有得到 `Date` 头。
+    '''
+    lo, hi = float('-inf'), float('inf')
+    rtt = 0.0
+    for _ in range(samples):
+        if hi - lo < 2:
+            # 让本次请求的中点落在预计的下一个服务器整秒时刻
+            offset = (lo + hi) / 2
+            tick = int(time.time() + offset) + 1
+            delay = tick - offset - rtt / 2 - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        t0 = time.time()
+        date = probe()
+        t1 = time.time()
+        if not date:
+            continue
+        rtt = t1 - t0
+        server = parsedate_to_datetime(date).timestamp()
+        new_lo, new_hi = max(lo, server - t1), min(hi, server + 1 - t0)
+        if new_lo > new_hi:
+            # 与之前的探测矛盾（例如服务器时钟被调整），以本次探测为准重新开始
+            new_lo, new_hi = server - t1, server + 1 - t0
+        lo, hi = new_lo, new_hi
+    if hi == float('inf'):
+        raise Exception('Server did not return a Date header.')
+    return (lo + hi) / 2, (hi - lo) / 2
+
+
+def sleep_until(local_ts: float, spin: float = 0.02):
+    '''睡眠到本地时间 `local_ts`，最后 `spin` 秒忙等以达到毫秒级精度。'''
+    while True:
+        remaining = local_ts - time.time()
+        if remaining <= 0:
+            return
+        if remaining > spin:
+            time.sleep(remaining - spin)
+        else:
+            time.sleep(0)
@@ -0,0 +1,104 @@
+'''同一门课程的并发选课合并为一个请求流。
+
+同一门课程可能出现在多个表达式中（例如 `a|x` 和 `b|x`），每个表达式各自反复选课会让
+同一个名额的请求数成倍增加。`SingleFlight` 按键（选课轮次ID, 课程ID）登记正在进行的
+选课：已有同一门课程在进行时，后来的调用只等待它的结果；已经选上的课程直接从结果缓存返回。
+'''
+import threading
+from typing import Awaitable, Callable, Hashable
+
+import metrics
+from classifier import ElectResult
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    '''按键合并并发调用，并缓存成功的结果。
+
+    线程和协程各自登记正在进行的调用，结果缓存由两者共享。
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._futures: dict[Hashable, object] = {}
+        self._won: dict[Hashable, ElectResult] = {}
+
+    def cached(self, key: Hashable) -> ElectResult | None:
+        '''已经选上的课程的结果，没有时返回 None。'''
+        return self._won.get(key)
+
+    def clear(self):
+        '''清空结果缓存，例如换了账号之后。'''
+        with self._lock:
+            self._won.clear()
+
+    def _store(self, key: Hashable, result: ElectResult):
+        if result.succeeded:
+            self._won[key] = result
+
+    def do(self, key: Hashable, func: Callable[[], ElectResult]) -> ElectResult:
+        '''执行 `func()`；同一个键已有调用在进行时等待它的结果，已经成功过时直接返回缓存。'''
+        with self._lock:
+            result = self._won.get(key)
+            if result is not None:
+                metrics.coalesced_attempts.inc('cache')
+                return result
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            metrics.coalesced_attempts.inc('inflight')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            self._store(key, call.result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key: Hashable, func: Callable[[], Awaitable[ElectResult]]) -> ElectResult:
+        '''`do` 的异步版本，`func` 为协程函数，同一个事件循环中的协程共享调用。'''
+        import asyncio
+
+        result = self._won.get(key)
+        if result is not None:
+            metrics.coalesced_attempts.inc('cache')
+            return result
+        future = self._futures.get(key)
+        if future is not None:
+            metrics.coalesced_attempts.inc('inflight')
+            return await asyncio.shield(future) # 等待的协程被取消时不影响正在进行的调用
+
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        # 没有协程在等待时，异常已由调用方处理，不需要事件循环再报告
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            result = await func()
+            self._store(key, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._futures[key]
@@ -0,0 +1,65 @@
+username = '12345678'  # 8位学号
+password = 'password'  # 统一身份认证密码
+
+skip_course_list = False  # 跳过课程列表
+check_course_availability = True  # 列出课程时检查是否有余量
+sheet_format = ''  # 导出课程列表的格式，'tsv' 或 'xlsx'，留空不导出
+
+# 默认选课表达式，键为选课轮次ID，留空进入交互模式
+default_courses_exps = {
+    # 'election_id_1': [
+    #     '114&&514;810',
+    #     '0721||1919',
+    # ],
+}
+
+interval = 0.5  # 同一表达式两次请求之间的间隔（秒）
+threads_interval = 0.1  # 启动两个线程之间的间隔（秒）
+
+# 课程已满时，已选人数/课容量不超过阈值（百分比）则继续重试
+ENABLE_RETRY_ON_PERCENTAGE_LIMIT = False
+RETRY_IF_COURSE_FULL_PERCENTAGE_THRESHOLD = 100
+
+async_engine = False  # 使用 asyncio 引擎代替每个表达式一个线程
+async_max_inflight = 32  # 异步引擎同时在途的请求数
+
+session_pool_size = 0  # HTTP Session 池大小，0 表示与表达式数量一致
+session_check_interval = 120  # 后台检查会话是否有效的间隔（秒），失效时自动重新登录，0 表示不检查
+session_max_age = 0  # 距上次登录超过该秒数时主动重新登录，0 表示只在检查失败时登录
+
+request_rate = 0  # 自适应限速器的初始总速率（请求/秒），0 表示使用 interval 固定间隔
+max_request_rate = 0  # 自适应限速器的速率上限，0 表示初始速率的4倍
+
+batch_window = 0  # 合并多个表达式选课请求的时间窗口（秒），0 表示不合并
+batch_max_size = 10  # 每个批量选课请求最多包含的课程数
+
+# 需要重试的课程统一排队，按课程余量、在“或”运算中的位置和最近的结果分配重试机会，
+# 越可能出现空位的课程重试越频繁；总的请求量不变。False 表示每门课程各自按 interval 重试
+retry_scheduling = False
+
+# 按服务器时间定时开始，北京时间 'YYYY-MM-DD HH:MM:SS'，留空立即开始
+# 也可以按选课轮次分别设置，例如 {'election_id_1': '2024-01-01 12:00:00'}，未列出的轮次立即开始
+scheduled_start = ''
+warmup_lead = 3  # 定时开始前多少秒预热连接池
+
+capacity_watch_interval = 0  # 课程余量监视器的轮询间隔（秒），0 表示不启用
+
+timetable_check = False  # 根据课程的上课时间在本地排除与已选课程冲突的课程，不再为它们发送选课请求（会调整或运算分支的顺序，默认不启用）
+elected_course_ids = []  # 开始选课前已经选上的课程ID，用于本地冲突检查
+
+log_path = ''  # 选课事件的 JSONL 日志文件，'-' 表示以 JSONL 格式输出到标准输出，留空只输出可读的文本
+log_level = 'INFO'  # 日志级别：DEBUG、INFO、WARNING、ERROR
+log_sample_interval = 1.0  # 同一课程反复出现的同类重试结果（如请求过快）每隔多少秒只输出一条，0 表示全部输出
+
+metrics_port = 0  # 在 http://127.0.0.1:端口/metrics 提供 Prometheus 格式的请求指标，0 表示不启用
+metrics_dump_path = ''  # 定期把请求指标写入的 JSON 文件，留空不写入
+metrics_dump_interval = 10  # 写入指标文件的间隔（秒）
+
+catalog_cache_path = 'catalog.sqlite3'  # 课程列表和学期信息的缓存文件（选课轮次总是实时获取）
+catalog_ttl = 3600  # 缓存的有效期（秒），过期后向服务器重新验证，0 表示不缓存
+
+capture_path = ''  # 把所有请求和响应录制到该 SQLite 归档，用于离线回放，留空不录制
+
+# 课程和表达式最终结果的检查点文件，进程重启后从中断的位置继续，不再为已有结果的课程发送请求；
+# 留空不记录，要重新开始时删除该文件
+checkpoint_path = ''
@@ -0,0 +1,228 @@
+'''结构化的事件日志。
+
+选课线程调用 `EventLog.emit` 只是把事件放入队列，由后台线程批量格式化并写出，
+选课线程不会因为竞争标准输出而互相阻塞。每个事件是一个 JSON 对象，包括时间、级别、
+事件名、线程名以及表达式、课程、结果、延迟、尝试次数等字段；控制台上按事件附带的
+消息模板输出一行可读的文本。
+
+同一个表达式中同一门课程反复出现的同类结果（例如“请不要过快点击”）可以抽样：
+每个 `sample_interval` 内只输出第一条，之后输出的记录带上期间被省略的条数 `suppressed`。
+
+用法：
+
+    python eventlog.py tail events.jsonl --follow --level WARNING
+    python eventlog.py aggregate events.jsonl
+'''
+import argparse
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+level_names = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+levels = {name: level for level, name in level_names.items()}
+
+
+class EventLog:
+    '''后台写出的事件日志。
+
+    Args:
+        path (str, optional): 追加写入 JSONL 的文件；为 '-' 时 JSONL 写到标准输出，代替可读的文本；
+            留空只在控制台输出文本。Defaults to ''.
+        level (int | str, optional): 低于该级别的事件被丢弃。Defaults to INFO.
+        sample_interval (float, optional): 抽样的时间窗口（秒），0 表示不抽样。Defaults to 1.0.
+    '''
+
+    def __init__(self, path: str = '', level: int | str = INFO, sample_interval: float = 1.0):
+        self.path = path
+        self.level = levels[level.upper()] if isinstance(level, str) else level
+        self.sample_interval = sample_interval
+        self._queue = queue.SimpleQueue()
+        self._samples: dict[tuple, list] = {} # 抽样键 -> [窗口开始时间, 省略的条数]
+        self._samples_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def emit(self, level: int, event: str, message: str | None = None, sample=None, **fields):
+        '''记录一个事件。
+
+        Args:
+            level (int): 事件级别。
+            event (str): 事件名，例如 'attempt'。
+            message (str | None, optional): 控制台输出的消息模板，用 `str.format(**fields)` 在后台线程中格式化。
+            sample (Hashable, optional): 抽样键，不为 None 时同一个键在每个抽样窗口内只记录一次。
+            **fields: 事件字段，必须可以序列化为 JSON。
+        '''
+        if level < self.level:
+            return
+        now = time.time()
+        if sample is not None and self.sample_interval > 0:
+            with self._samples_lock:
+                window = self._samples.get(sample)
+                if window is not None and now - window[0] < self.sample_interval:
+                    window[1] += 1
+                    return
+                suppressed = window[1] if window is not None else 0
+                self._samples[sample] = [now, 0]
+            if suppressed:
+                fields['suppressed'] = suppressed
+        record = {'ts': round(now, 6), 'level': level_names.get(level, str(level)), 'event': event,
+                  'thread': threading.current_thread().name, **fields}
+        self._queue.put((record, message))
+        if self._thread is None:
+            self._start()
+
+    def debug(self, event: str, message: str | None = None, **fields):
+        self.emit(DEBUG, event, message, **fields)
+
+    def info(self, event: str, message: str | None = None, **fields):
+        self.emit(INFO, event, message, **fields)
+
+    def warning(self, event: str, message: str | None = None, **fields):
+        self.emit(WARNING, event, message, **fields)
+
+    def error(self, event: str, message: str | None = None, **fields):
+        self.emit(ERROR, event, message, **fields)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name='eventlog')
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        file = open(self.path, 'a', encoding='utf-8') if self.path and self.path != '-' else None
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < 1000:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            self._write(batch, file)
+
+    def _write(self, batch: list, file):
+        lines, texts, done = [], [], []
+        for record, message in batch:
+            if record is None: # `flush` 放入的标记
+                done.append(message)
+                continue
+            line = json.dumps(record, ensure_ascii=False)
+            lines.append(line)
+            if self.path == '-':
+                texts.append(line)
+            else:
+                texts.append(_format(record, message))
+        try:
+            if file is not None and lines:
+                file.write('\n'.join(lines) + '\n')
+                file.flush()
+            if texts:
+                out = sys.stdout # 每次写出时再取，跟随调用方对标准输出的重定向
+                out.write('\n'.join(texts) + '\n')
+                out.flush()
+        except (OSError, ValueError):
+            pass
+        for flushed in done:
+            flushed.set()
+
+    def flush(self, timeout: float = 5.0):
+        '''等待已记录的事件全部写出。'''
+        if self._thread is None:
+            return
+        flushed = threading.Event()
+        self._queue.put((None, flushed))
+        flushed.wait(timeout)
+
+
+def _format(record: dict, message: str | None) -> str:
+    if message is None:
+        fields = ' '.join(f'{key}={value}' for key, value in record.items() if key not in ('ts', 'level', 'event', 'thread'))
+        return f'[{record["level"].title()}] {record["event"]} {fields}'.rstrip()
+    try:
+        text = message.format(**record)
+    except (KeyError, IndexError, ValueError):
+        text = message
+    if record.get('suppressed'):
+        text += f' (+{record["suppressed"]} similar suppressed)'
+    return text
+
+
+def read_records(path: str, follow: bool = False):
+    '''逐条读取 JSONL 日志，`follow` 为 True 时等待新写入的记录。'''
+    with open(path, encoding='utf-8') as f:
+        while True:
+            line = f.readline()
+            if not line:
+                if not follow:
+                    return
+                time.sleep(0.2)
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def tail(path: str, follow: bool, level: str, exp: str | None):
+    min_level = levels[level.upper()]
+    for record in read_records(path, follow):
+        if levels.get(record.get('level'), 0) < min_level:
+            continue
+        if exp is not None and record.get('exp') != exp:
+            continue
+        when = time.strftime('%H:%M:%S', time.localtime(record.get('ts', 0)))
+        fields = ' '.join(f'{key}={value}' for key, value in record.items()
+                          if key not in ('ts', 'level', 'event', 'thread'))
+        print(f'{when} {record.get("level", ""):<7} {record.get("event", ""):<14} {fields}', flush=True)
+
+
+def aggregate(path: str):
+    '''按事件和选课结果统计次数、被抽样省略的次数和延迟分位数，并列出每个表达式的尝试次数。'''
+    counts = defaultdict(int)
+    latencies = defaultdict(list)
+    attempts = defaultdict(int)
+    for record in read_records(path):
+        key = (record.get('event'), record.get('outcome', ''))
+        n = 1 + record.get('suppressed', 0)
+        counts[key] += n
+        if 'latency' in record:
+            latencies[key].append(record['latency'])
+        if record.get('event') == 'attempt':
+            attempts[record.get('exp')] += n
+    print(f'{"event":<16}{"outcome":<14}{"count":>8}{"p50":>10}{"p99":>10}')
+    for key in sorted(counts, key=lambda key: -counts[key]):
+        values = sorted(latencies[key])
+        p50 = f'{values[len(values) // 2] * 1000:.1f}ms' if values else '-'
+        p99 = f'{values[min(len(values) - 1, int(len(values) * 0.99))] * 1000:.1f}ms' if values else '-'
+        print(f'{key[0]:<16}{key[1]:<14}{counts[key]:>8}{p50:>10}{p99:>10}')
+    if attempts:
+        print(f'\n{"expression":<40}{"attempts":>10}')
+        for exp, n in sorted(attempts.items(), key=lambda item: -item[1]):
+            print(f'{exp:<40}{n:>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspect a JSONL event log.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    tail_parser = subparsers.add_parser('tail', help='print the events')
+    tail_parser.add_argument('path')
+    tail_parser.add_argument('--follow', '-f', action='store_true', help='wait for new events')
+    tail_parser.add_argument('--level', default='DEBUG', choices=list(levels))
+    tail_parser.add_argument('--exp', help='only show events of this expression')
+    aggregate_parser = subparsers.add_parser('aggregate', help='counts and latencies by event and outcome')
+    aggregate_parser.add_argument('path')
+    args = parser.parse_args()
+    if args.command == 'tail':
+        tail(args.path, args.follow, args.level, args.exp)
+    else:
+        aggregate(args.path)
@@ -0,0 +1,67 @@
+'''选课过程中的事件发布与订阅。
+
+选课循环每次尝试后发布一个事件，GUI 等订阅方各自持有一个线程安全的队列，
+在自己的线程中按需取出。没有订阅方时 `publish` 直接返回，不影响选课循环的开销。
+'''
+import queue
+import threading
+import time
+from typing import Any, NamedTuple
+
+
+class Event(NamedTuple):
+    '''一个事件。
+
+    Args:
+        kind (str): 事件类型，例如 'plan_started'、'attempt'、'plan_finished'。
+        time (float): 发布时的 `time.time()`。
+        fields (dict[str, Any]): 事件内容。
+    '''
+    kind: str
+    time: float
+    fields: dict[str, Any]
+
+
+class EventBus:
+    '''把事件分发到所有订阅队列。'''
+
+    def __init__(self):
+        self._queues: list[queue.Queue] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> queue.Queue:
+        '''返回一个新的订阅队列，之后发布的每个事件都会放入其中。'''
+        q = queue.Queue()
+        with self._lock:
+            self._queues = self._queues + [q]
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            self._queues = [other for other in self._queues if other is not q]
+
+    def publish(self, kind: str, **fields):
+        queues = self._queues # 订阅时整体替换列表，这里不需要加锁
+        if not queues:
+            return
+        event = Event(kind, time.time(), fields)
+        for q in queues:
+            q.put_nowait(event)
+
+
+# 进程内共享的事件总线
+bus = EventBus()
+subscribe = bus.subscribe
+unsubscribe = bus.unsubscribe
+publish = bus.publish
+
+
+def drain(q: queue.Queue, limit: int = 10000) -> list[Event]:
+    '''不阻塞地取出队列中的事件，最多 `limit` 个。'''
+    events = []
+    try:
+        while len(events) < limit:
+            events.append(q.get_nowait())
+    except queue.Empty:
+        pass
+    return events
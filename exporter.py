@@ -0,0 +1,53 @@
+'''课程列表导出。
+
+逐行写入 tsv 或 xlsx 文件，不需要先构造整张表格；xlsx 使用 openpyxl 的只写模式，
+只在导出时才导入 openpyxl。
+'''
+import csv
+import json
+from typing import Any
+
+formats = ('tsv', 'xlsx')
+
+
+def columns(courses: list[dict]) -> list[str]:
+    '''所有课程字段的并集，按第一次出现的顺序排列。'''
+    return list(dict.fromkeys(key for course in courses for key in course))
+
+
+def _cell(value: Any) -> Any:
+    # 上课安排等嵌套字段写成 JSON 字符串
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def export_tsv(courses: list[dict], path: str):
+    keys = columns(courses)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow(keys)
+        for course in courses:
+            writer.writerow(['' if course.get(key) is None else _cell(course.get(key)) for key in keys])
+
+
+def export_xlsx(courses: list[dict], path: str):
+    from openpyxl import Workbook
+
+    keys = columns(courses)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(keys)
+    for course in courses:
+        ws.append([_cell(course.get(key)) for key in keys])
+    wb.save(path)
+
+
+def export(courses: list[dict], path: str, sheet_format: str):
+    '''按 `sheet_format`（'tsv' 或 'xlsx'）导出课程列表到 `path`。'''
+    if sheet_format == 'tsv':
+        export_tsv(courses, path)
+    elif sheet_format == 'xlsx':
+        export_xlsx(courses, path)
+    else:
+        raise ValueError(f'Unsupported sheet format: {sheet_format!r}')
@@ -0,0 +1,194 @@
+'''选课表达式的编译与求值。
+
+表达式只在启动时编译一次，得到一棵不可变的语法树，之后每次求值只遍历语法树，
+不再做任何字符串切分。运算符优先级从低到高为：
+
+- ';' 顺序：依次执行全部子表达式，结果为最后一个子表达式的结果。
+- '|' 或：从左到右尝试，遇到成功即停止。
+- '&' 与：从左到右尝试，遇到失败即停止。
+
+同时支持 '&&'、'||' 的写法以及用括号改变优先级，例如 `(a|b)&c;d`。
+'''
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Iterator
+
+
+class ExpressionError(ValueError):
+    '''表达式语法错误或引用了不存在的课程。'''
+
+
+@dataclass(frozen=True)
+class Course:
+    id: str
+
+
+@dataclass(frozen=True)
+class Seq:
+    items: tuple
+
+
+@dataclass(frozen=True)
+class Or:
+    items: tuple
+
+
+@dataclass(frozen=True)
+class And:
+    items: tuple
+
+
+Node = Course | Seq | Or | And
+
+_token_re = re.compile(r'\s*(?:(?P<id>\w+)|(?P<op>&&?|\|\|?|;|\(|\))|(?P<bad>\S))')
+
+
+def _tokenize(exp: str) -> list[str]:
+    tokens = []
+    for m in _token_re.finditer(exp):
+        if m.group('bad'):
+            raise ExpressionError(f'Unexpected character {m.group("bad")!r} in {exp!r}')
+        if m.group('id'):
+            tokens.append(m.group('id'))
+        elif m.group('op'):
+            tokens.append(m.group('op')[0])  # '&&' 与 '&'、'||' 与 '|' 等价
+    return tokens
+
+
+class _Parser:
+    def __init__(self, exp: str):
+        self.exp = exp
+        self.tokens = _tokenize(exp)
+        self.pos = 0
+
+    def peek(self) -> str | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self) -> str | None:
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self) -> Node:
+        node = self.binary(0)
+        if self.peek() is not None:
+            raise ExpressionError(f'Unexpected {self.peek()!r} in {self.exp!r}')
+        return node
+
+    _levels = ((';', Seq), ('|', Or), ('&', And))
+
+    def binary(self, level: int) -> Node:
+        if level == len(self._levels):
+            return self.atom()
+        op, node_type = self._levels[level]
+        items = [self.binary(level + 1)]
+        while self.peek() == op:
+            self.take()
+            items.append(self.binary(level + 1))
+        return items[0] if len(items) == 1 else node_type(tuple(items))
+
+    def atom(self) -> Node:
+        token = self.take()
+        if token == '(':
+            node = self.binary(0)
+            if self.take() != ')':
+                raise ExpressionError(f'Missing ")" in {self.exp!r}')
+            return node
+        if token is None or token in '&|;)':
+            raise ExpressionError(f'Expected a course id in {self.exp!r}')
+        return Course(token)
+
+
+def course_ids(node: Node) -> Iterator[str]:
+    '''按出现顺序遍历表达式中的全部课程ID。'''
+    if isinstance(node, Course):
+        yield node.id
+    else:
+        for item in node.items:
+            yield from course_ids(item)
+
+
+def or_positions(node: Node) -> dict[str, int]:
+    '''每门课程在“或”运算中的位置：所在分支前面的分支数之和，嵌套的“或”逐层累加。
+
+    位置越大，表示要在越多的分支失败之后才会选这门课程。同一门课程出现多次时取最小的位置。
+    '''
+    positions = {}
+
+    def visit(node: Node, position: int):
+        if isinstance(node, Course):
+            positions[node.id] = min(position, positions.get(node.id, position))
+            return
+        for i, item in enumerate(node.items):
+            visit(item, position + i if isinstance(node, Or) else position)
+
+    visit(node, 0)
+    return positions
+
+
+def compile_exp(exp: str, catalog_ids: Iterable | None = None) -> Node:
+    '''将表达式字符串编译为语法树。
+
+    Args:
+        exp (str): 选课表达式，例如 `114&&514;810`。
+        catalog_ids (Iterable | None, optional): 当前选课轮次的全部课程ID，
+            提供时会检查表达式中的每个课程ID是否存在。Defaults to None.
+
+    Returns:
+        Node: 不可变的语法树。
+
+    Raises:
+        ExpressionError: 表达式语法错误，或课程ID不在 `catalog_ids` 中。
+    '''
+    node = _Parser(exp).parse()
+    if catalog_ids is not None:
+        known = {str(i) for i in catalog_ids}
+        unknown = [i for i in course_ids(node) if i not in known]
+        if unknown:
+            raise ExpressionError(f'Unknown course ids {unknown} in {exp!r}')
+    return node
+
+
+def format_exp(node: Node) -> str:
+    '''把语法树格式化为表达式字符串，只在需要时加括号。'''
+    if isinstance(node, Course):
+        return node.id
+    op, level = {Seq: (';', 0), Or: ('|', 1), And: ('&', 2)}[type(node)]
+    parts = []
+    for item in node.items:
+        text = format_exp(item)
+        if not isinstance(item, Course) and {Seq: 0, Or: 1, And: 2}[type(item)] <= level:
+            text = f'({text})'
+        parts.append(text)
+    return op.join(parts)
+
+
+def evaluate(node: Node, attempt: Callable[[str], list]) -> list:
+    '''求值语法树，`attempt(course_id)` 负责对单个课程选课并返回结果列表。
+
+    结果列表的格式同 `main.elect_course`，第3个元素表示是否成功。
+    '''
+    if isinstance(node, Course):
+        return attempt(node.id)
+    result = []
+    for item in node.items:
+        result = evaluate(item, attempt)
+        if isinstance(node, Or) and result[2]:
+            break
+        if isinstance(node, And) and not result[2]:
+            break
+    return result
+
+
+async def aevaluate(node: Node, attempt: Callable[[str], Awaitable[list]]) -> list:
+    '''`evaluate` 的异步版本，`attempt` 为协程函数。'''
+    if isinstance(node, Course):
+        return await attempt(node.id)
+    result = []
+    for item in node.items:
+        result = await aevaluate(item, attempt)
+        if isinstance(node, Or) and result[2]:
+            break
+        if isinstance(node, And) and not result[2]:
+            break
+    return result
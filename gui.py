@@ -1,117 +1,271 @@
+import os
+import queue
 import tkinter as tk
-from tkinter import messagebox
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox, ttk
+import events
+import exps
 import main
 
+# 主循环处理后台任务结果和选课事件的间隔（毫秒）
+poll_interval = 100
+
+# 保存各账号cookies的目录，文件以学号命名
+cookies_dir = 'cookies'
+
+# 选课表格的列：列名 -> (标题, 宽度)
+dashboard_columns = {
+    'expression': ('Expression', 220),
+    'course': ('Course', 90),
+    'attempts': ('Attempts', 70),
+    'message': ('Last Message', 280),
+    'latency': ('Latency', 80),
+    'state': ('State', 90),
+}
+
+
 class GUI:
     def __init__(self, root):
         self.root = root
         self.root.title("SUEP Course Elect")
 
-        self.username_label = tk.Label(root, text="Username")
-        self.username_label.pack()
-        self.username_entry = tk.Entry(root)
-        self.username_entry.pack()
+        # 网络请求都在后台线程中执行，Tk 控件只在主循环中更新
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='gui')
+        self.done = queue.Queue() # 已完成的后台任务：(回调, 出错时的回调, 标题, future)
+        self.events = events.subscribe()
+        self.elections = {}
+        self.courses = {} # 选课轮次ID -> 课程列表
+        self.rows = {} # (选课轮次ID, 表达式) -> 表格行
+        self.filled_exps = '' # 最近一次自动填入的默认选课表达式
 
-        self.password_label = tk.Label(root, text="Password")
-        self.password_label.pack()
-        self.password_entry = tk.Entry(root, show="*")
-        self.password_entry.pack()
+        login_frame = tk.Frame(root)
+        login_frame.pack(fill=tk.X, padx=8, pady=4)
+        tk.Label(login_frame, text="Username").grid(row=0, column=0, sticky=tk.W)
+        self.username_entry = tk.Entry(login_frame)
+        self.username_entry.insert(0, main.username)
+        self.username_entry.grid(row=0, column=1)
+        tk.Label(login_frame, text="Password").grid(row=0, column=2, sticky=tk.W)
+        self.password_entry = tk.Entry(login_frame, show="*")
+        self.password_entry.insert(0, main.password)
+        self.password_entry.grid(row=0, column=3)
+        self.login_button = tk.Button(login_frame, text="Login", command=self.login)
+        self.login_button.grid(row=0, column=4, padx=4)
 
-        self.login_button = tk.Button(root, text="Login", command=self.login)
-        self.login_button.pack()
+        election_frame = tk.Frame(root)
+        election_frame.pack(fill=tk.X, padx=8, pady=4)
+        tk.Label(election_frame, text="Election").pack(side=tk.LEFT)
+        self.election_var = tk.StringVar(root)
+        self.election_var.trace_add('write', lambda *_: self.fill_default_exps())
+        self.election_box = ttk.Combobox(election_frame, textvariable=self.election_var, state='readonly', width=40)
+        self.election_box.pack(side=tk.LEFT, padx=4)
+        tk.Button(election_frame, text="Refresh", command=self.refresh_elections).pack(side=tk.LEFT)
+        self.view_courses_list_button = tk.Button(election_frame, text="View Courses List", command=self.view_courses_list)
+        self.view_courses_list_button.pack(side=tk.LEFT, padx=4)
+        self.export_courses_list_button = tk.Button(election_frame, text="Export Courses List", command=self.export_courses_list)
+        self.export_courses_list_button.pack(side=tk.LEFT)
 
+        tk.Label(root, text="Course expressions (one per line)").pack(anchor=tk.W, padx=8)
+        self.exps_text = tk.Text(root, height=5)
+        self.exps_text.pack(fill=tk.X, padx=8)
         self.select_courses_button = tk.Button(root, text="Select Courses", command=self.select_courses)
-        self.select_courses_button.pack()
+        self.select_courses_button.pack(pady=4)
+
+        self.dashboard = ttk.Treeview(root, columns=list(dashboard_columns), show='headings', height=12)
+        for column, (heading, width) in dashboard_columns.items():
+            self.dashboard.heading(column, text=heading)
+            self.dashboard.column(column, width=width, stretch=column in ('expression', 'message'))
+        self.dashboard.pack(fill=tk.BOTH, expand=True, padx=8, pady=4)
+
+        self.status_var = tk.StringVar(root, value="Not logged in")
+        tk.Label(root, textvariable=self.status_var, anchor=tk.W).pack(fill=tk.X, padx=8, pady=(0, 4))
 
-        self.view_courses_list_button = tk.Button(root, text="View Courses List", command=self.view_courses_list)
-        self.view_courses_list_button.pack()
+        self.root.protocol('WM_DELETE_WINDOW', self.close)
+        self.root.after(poll_interval, self.poll)
 
-        self.export_courses_list_button = tk.Button(root, text="Export Courses List", command=self.export_courses_list)
-        self.export_courses_list_button.pack()
+    def run_in_background(self, func, on_done, *args, title="Error", on_error=None):
+        '''在后台线程中执行 `func(*args)`，完成后在主循环中调用 `on_done(result)`；
+        出错时弹窗提示，并调用 `on_error()`（如果提供）。'''
+        def callback(future):
+            self.done.put((on_done, on_error, title, future))
+        self.executor.submit(func, *args).add_done_callback(callback)
+
+    def poll(self):
+        # 一次取出所有积压的事件，同一行在一轮中只刷新一次
+        while True:
+            try:
+                on_done, on_error, title, future = self.done.get_nowait()
+            except queue.Empty:
+                break
+            error = future.exception()
+            if error is not None:
+                self.status_var.set(f"{title}: {error}")
+                if on_error is not None:
+                    on_error()
+                messagebox.showerror(title, f"{title}: {error}")
+            else:
+                on_done(future.result())
+        changed = {}
+        for event in events.drain(self.events):
+            key = (event.fields.get('e_id'), event.fields.get('exp'))
+            changed[key] = self.apply_event(key, event)
+        for key, values in changed.items():
+            self.update_row(key, values)
+        self.root.after(poll_interval, self.poll)
+
+    def apply_event(self, key, event):
+        values = self.rows.setdefault(key, {'expression': key[1], 'course': '', 'attempts': 0,
+                                            'message': '', 'latency': '', 'state': 'running'})
+        fields = event.fields
+        if event.kind == 'attempt':
+            values['attempts'] += 1
+            values['course'] = fields['course_id']
+            values['message'] = fields['msg']
+            values['latency'] = f"{fields['latency'] * 1000:.0f}ms"
+        elif event.kind == 'plan_finished':
+            values['state'] = 'succeeded' if fields['result'].succeeded else 'failed'
+        elif event.kind == 'plan_failed':
+            values['state'] = 'error'
+            values['message'] = fields['error']
+        return values
+
+    def update_row(self, key, values):
+        iid = f'{key[0]}:{key[1]}'
+        row = [values[column] for column in dashboard_columns]
+        if self.dashboard.exists(iid):
+            self.dashboard.item(iid, values=row)
+        else:
+            self.dashboard.insert('', tk.END, iid=iid, values=row)
+
+    def close(self):
+        events.unsubscribe(self.events)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
 
     def login(self):
-        username = self.username_entry.get()
-        password = self.password_entry.get()
-        try:
-            main.ids.login(username, password, main.service)
-            if main.ids.ok:
-                messagebox.showinfo("Login", "Login successful")
+        main.username = self.username_entry.get()
+        main.password = self.password_entry.get()
+        self.login_button.config(state=tk.DISABLED)
+        self.status_var.set("Logging in...")
+
+        def on_login(ids):
+            self.login_button.config(state=tk.NORMAL)
+            if ids.ok:
+                self.status_var.set(f"Logged in as {main.username}")
+                self.refresh_elections()
             else:
+                self.status_var.set("Login failed")
                 messagebox.showerror("Login", "Login failed")
-        except Exception as e:
-            messagebox.showerror("Login", f"Login failed: {e}")
+        self.run_in_background(self.login_ids, on_login, main.username, title="Login failed",
+                               on_error=lambda: self.login_button.config(state=tk.NORMAL))
 
-    def select_courses(self):
-        try:
-            elections = main.get_elections()
-            if not elections:
-                messagebox.showinfo("Select Courses", "No available elections")
-                return
+    @staticmethod
+    def login_ids(username):
+        # 每个学号使用单独的cookies文件（同 orchestrator），切换账号时不会沿用上一个账号的会话
+        os.makedirs(cookies_dir, exist_ok=True)
+        return main.login_ids(os.path.join(cookies_dir, f'{username}.json'))
 
-            election_id = list(elections.values())[0] if len(elections) == 1 else self.select_election(elections)
-            if not election_id:
-                return
+    def logged_in(self, title):
+        if main.ids is None or not main.ids.ok:
+            messagebox.showinfo(title, "Please login first")
+            return False
+        return True
 
-            main.head_election(election_id)
-            main.thread_elect_courses_exps([], election_id)
-            messagebox.showinfo("Select Courses", "Courses selected successfully")
-        except Exception as e:
-            messagebox.showerror("Select Courses", f"Failed to select courses: {e}")
+    def refresh_elections(self):
+        if not self.logged_in("Elections"):
+            return
 
-    def select_election(self, elections):
-        election_window = tk.Toplevel(self.root)
-        election_window.title("Select Election")
+        def on_elections(elections):
+            self.elections = elections
+            self.election_box['values'] = list(elections)
+            if elections and self.election_var.get() not in elections:
+                self.election_var.set(next(iter(elections)))
+            self.status_var.set(f"{len(elections)} elections available")
+        self.run_in_background(main.get_elections, on_elections, title="Failed to get elections")
 
-        election_var = tk.StringVar(election_window)
-        election_var.set(list(elections.keys())[0])
+    def fill_default_exps(self):
+        '''填入所选选课轮次的默认选课表达式，用户修改过的表达式不覆盖。'''
+        current = self.exps_text.get('1.0', tk.END).strip()
+        if current and current != self.filled_exps:
+            return
+        election_id = self.elections.get(self.election_var.get())
+        self.filled_exps = '\n'.join(main.default_courses_exps.get(election_id, []))
+        self.exps_text.delete('1.0', tk.END)
+        self.exps_text.insert('1.0', self.filled_exps)
 
-        election_menu = tk.OptionMenu(election_window, election_var, *elections.keys())
-        election_menu.pack()
+    def selected_election(self, title):
+        if not self.logged_in(title):
+            return None
+        election_id = self.elections.get(self.election_var.get())
+        if not election_id:
+            messagebox.showinfo(title, "No available elections")
+        return election_id
 
-        def on_select():
-            election_window.destroy()
+    def fetch_courses(self, election_id):
+        main.head_election(election_id)
+        return main.get_courses(election_id)
 
-        select_button = tk.Button(election_window, text="Select", command=on_select)
-        select_button.pack()
+    def select_courses(self):
+        election_id = self.selected_election("Select Courses")
+        if not election_id:
+            return
+        exps_list = [line.strip() for line in self.exps_text.get('1.0', tk.END).splitlines() if line.strip()]
+        if not exps_list:
+            messagebox.showinfo("Select Courses", "Please enter at least one course expression")
+            return
+        # 先检查语法，避免把无效的表达式交给后台线程
+        for exp_item in exps_list:
+            try:
+                exps.compile_exp(exp_item)
+            except exps.ExpressionError as e:
+                messagebox.showerror("Select Courses", f"Invalid expression {exp_item!r}: {e}")
+                return
+        self.select_courses_button.config(state=tk.DISABLED)
+        self.status_var.set(f"Electing {len(exps_list)} expressions...")
 
-        self.root.wait_window(election_window)
-        return elections.get(election_var.get())
+        def on_done(results):
+            self.select_courses_button.config(state=tk.NORMAL)
+            won = sum(1 for _, result in results if result is not None and result.succeeded)
+            self.status_var.set(f"Election finished: {won}/{len(results)} expressions succeeded")
+        self.run_in_background(main.elect_courses_exps, on_done, exps_list, election_id,
+                               self.courses.get(election_id), title="Failed to select courses",
+                               on_error=lambda: self.select_courses_button.config(state=tk.NORMAL))
 
     def view_courses_list(self):
-        try:
-            elections = main.get_elections()
-            if not elections:
-                messagebox.showinfo("View Courses List", "No available elections")
-                return
+        election_id = self.selected_election("View Courses List")
+        if not election_id:
+            return
 
-            election_id = list(elections.values())[0] if len(elections) == 1 else self.select_election(elections)
-            if not election_id:
-                return
-
-            main.head_election(election_id)
-            data = main.get_courses(election_id)
-            courses_list = "\n".join([f"{course['id']}: {course['name']}" for course in data])
-            messagebox.showinfo("Courses List", courses_list)
-        except Exception as e:
-            messagebox.showerror("View Courses List", f"Failed to view courses list: {e}")
+        def on_courses(data):
+            self.courses[election_id] = data
+            window = tk.Toplevel(self.root)
+            window.title(f"Courses List ({len(data)})")
+            tree = ttk.Treeview(window, columns=('id', 'no', 'name', 'teachers'), show='headings')
+            for column, width in (('id', 90), ('no', 90), ('name', 260), ('teachers', 160)):
+                tree.heading(column, text=column)
+                tree.column(column, width=width)
+            for course in data:
+                tree.insert('', tk.END, values=[course.get(column, '') for column in ('id', 'no', 'name', 'teachers')])
+            scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            tree.pack(fill=tk.BOTH, expand=True)
+        self.run_in_background(self.fetch_courses, on_courses, election_id, title="Failed to view courses list")
 
     def export_courses_list(self):
-        try:
-            elections = main.get_elections()
-            if not elections:
-                messagebox.showinfo("Export Courses List", "No available elections")
-                return
+        election_id = self.selected_election("Export Courses List")
+        if not election_id:
+            return
 
-            election_id = list(elections.values())[0] if len(elections) == 1 else self.select_election(elections)
-            if not election_id:
-                return
+        def export(election_id):
+            data = self.fetch_courses(election_id)
+            return data, main.export_courses_list(data, election_id)
+
+        def on_exported(result):
+            data, file_name = result
+            self.courses[election_id] = data
+            messagebox.showinfo("Export Courses List", f"Courses list exported to {file_name}")
+        self.run_in_background(export, on_exported, election_id, title="Failed to export courses list")
 
-            main.head_election(election_id)
-            data = main.get_courses(election_id)
-            main.export_courses_list(data, election_id)
-            messagebox.showinfo("Export Courses List", "Courses list exported successfully")
-        except Exception as e:
-            messagebox.showerror("Export Courses List", f"Failed to export courses list: {e}")
 
 if __name__ == "__main__":
     root = tk.Tk()
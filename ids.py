@@ -1,10 +1,118 @@
+import json
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+import metrics
 import requests
-from lxml import etree
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from functools import partial
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+from urllib3.connection import HTTPConnection
+
+
+class SharedCookieJar(RequestsCookieJar):
+    '''可在多个 Session 之间共享的 cookie jar。
+
+    CookieJar 的写操作本身带锁，但 requests 在构造请求时会遍历 jar，
+    这里让遍历也在锁内先取快照，避免与其他线程的写操作冲突。
+    '''
+
+    def __iter__(self):
+        with self._cookies_lock:
+            return iter(list(super().__iter__()))
+
+    def replace(self, other: RequestsCookieJar):
+        '''用 `other` 中的 cookies 原子地替换全部内容，正在构造的请求看到的要么全是旧的，要么全是新的。'''
+        cookies = other.copy()._cookies
+        with self._cookies_lock:
+            self._cookies = cookies
+
+    def copy(self):
+        new_cj = SharedCookieJar()
+        new_cj.set_policy(self.get_policy())
+        new_cj.update(self)
+        return new_cj
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    '''开启 TCP keep-alive 的连接池适配器，保证空闲连接在选课高峰前不被中间设备断开。'''
+    socket_options = HTTPConnection.default_socket_options + [
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        socket_options += [
+            (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30),
+            (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10),
+        ]
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs['socket_options'] = self.socket_options
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+
+class SessionKeeper:
+    '''后台会话保活：定期用 HEAD 请求检查会话，失效或到达 `max_age` 时在选课请求发现之前重新登录。
+
+    检查请求本身也会刷新服务器端会话的空闲超时。
+
+    Args:
+        ids (IdsAuth): 要保活的认证对象。
+        username (str): 重新登录使用的用户名。
+        password (str): 重新登录使用的密码。
+        service (str): 登录服务地址。
+        interval (float): 检查间隔（秒）。
+        max_age (float, optional): 距上次登录超过该秒数时主动重新登录，0 表示只在检查失败时登录。Defaults to 0.
+    '''
+
+    def __init__(self, ids: 'IdsAuth', username: str, password: str, service: str,
+                 interval: float, max_age: float = 0):
+        self.ids = ids
+        self.credentials = (username, password, service)
+        self.interval = interval
+        self.max_age = max_age
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='session-keeper')
+
+    def start(self) -> 'SessionKeeper':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def beat(self):
+        '''检查一次会话，需要时重新登录。'''
+        ids = self.ids
+        generation = ids.generation
+        if self.max_age > 0 and time.monotonic() - ids.logged_in_at >= self.max_age:
+            print('[Info] Session is about to expire, logging in again...')
+        elif ids.check():
+            return
+        else:
+            print('[Info] Session expired, logging in again...')
+        ids.relogin(*self.credentials, generation)
+        if not ids.ok:
+            print('[Warning] Failed to log in again, will retry at the next heartbeat.')
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as e:
+                print(f'[Warning] Session heartbeat failed: {e}')
 
 
 class IdsAuth:
     cookies = {}
-    ok = False
 
     headers = {
         'User-Agent':
@@ -12,54 +120,247 @@ class IdsAuth:
         'AppleWebKit/537.36 (KHTML, like Gecko) '
         'Chrome/106.0.0.0 Safari/537.36',
     }
-    s = requests.Session()
     rVerify = False  # 修改为False以禁用SSL证书验证
+    login_url = 'https://ids.shiep.edu.cn/authserver/login'
+    check_url = 'https://jw.shiep.edu.cn/eams/home.action'
+    # 每个 Session 的连接池大小，一个 Session 同一时间只被一个工作线程使用
+    connections_per_session = 2
+    # 异步接口使用的执行器，同时在途的阻塞请求数不超过 max_inflight
+    max_inflight = 32
+    _executor = None
 
-    def __init__(self, cookies=None):
+    def __init__(self, cookies=None, pool_size: int = 1, cookies_path: str | None = None):
+        # 所有 Session 共享同一个 cookie jar，每个工作线程借用各自的 Session 和连接池
+        self.jar = SharedCookieJar()
+        self.pool_size = max(1, pool_size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        # 每次登录成功后 generation 加一，用于判断会话过期后是否已有其他线程重新登录
+        self.generation = 0
+        self.cookies_path = cookies_path
+        self._login_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # 会话是否有效，None 表示尚未检查，第一次读取 `ok` 时才发送检查请求
+        self._ok = None
+        self.logged_in_at = time.monotonic()
+        self.keeper = None
+        # 创建连接池适配器的函数，参数同 HTTPAdapter；录制和回放时由 `capture` 替换
+        self.adapter_factory = KeepAliveAdapter
         if cookies:
-            self.s.cookies = requests.utils.cookiejar_from_dict(cookies)
-            self.cookies = self.s.cookies.get_dict()
-            self.check()
+            self.jar.update(cookies)
+            self.cookies = self.jar.get_dict()
+        else:
+            self._ok = False
         # 禁用SSL验证警告
         import urllib3
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+    @property
+    def ok(self) -> bool:
+        if self._ok is None:
+            self.check()
+        return self._ok
+
+    @ok.setter
+    def ok(self, value: bool):
+        self._ok = value
+
+    def _new_session(self, jar: SharedCookieJar | None = None) -> requests.Session:
+        s = requests.Session()
+        s.cookies = self.jar if jar is None else jar
+        adapter = self.adapter_factory(pool_connections=4,
+                                       pool_maxsize=self.connections_per_session)
+        s.mount('https://', adapter)
+        s.mount('http://', adapter)
+        return s
+
+    def set_transport(self, adapter_factory):
+        '''替换创建连接池适配器的函数，之后新建的 Session 都使用它，已经空闲的 Session 被丢弃。'''
+        with self._pool_lock:
+            self.adapter_factory = adapter_factory
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._created -= 1
+
+    def set_pool_size(self, pool_size: int):
+        '''设置 Session 池的大小，通常与并发的选课表达式数量一致。'''
+        with self._pool_lock:
+            self.pool_size = max(1, pool_size)
+
+    @contextmanager
+    def session(self):
+        '''从池中借用一个 Session，池已满时等待其他工作线程归还。'''
+        try:
+            s = self._idle.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                create = self._created < self.pool_size
+                if create:
+                    self._created += 1
+            s = self._new_session() if create else self._idle.get()
+        try:
+            yield s
+        finally:
+            self._idle.put(s)
+
     def login(self, username: str, password: str, service: str):
-        url = 'https://ids.shiep.edu.cn/authserver/login'
-
-        resp = self.s.get(url,
-                          params={'service': service},
-                          headers=self.headers,
-                          verify=self.rVerify)
-        e = etree.HTML(resp.text)
-        form = {
-            i.get('name'): i.get('value')
-            for i in e.xpath('//form//input')
-        }
-        form['username'] = username
-        form['password'] = password
-
-        resp = self.s.post(url,
-                           params={'service': service},
-                           data=form,
-                           headers=self.headers,
-                           verify=self.rVerify)
-        self.cookies = self.s.cookies.get_dict()
-        self.check()
-
-    def check(self):
-        url = 'https://jw.shiep.edu.cn/eams/home.action'
-        resp = self.s.get(url,
-                          headers=self.headers,
-                          verify=self.rVerify,
-                          allow_redirects=False)
-        self.ok = (resp.status_code == 200)
+        from lxml import etree
+
+        url = self.login_url
+        # 在新的 cookie jar 中登录，成功后再整体替换共享的 jar：其他 Session 正在发送的请求不受影响，
+        # 新的 cookies 中也不会混有过期的 JSESSIONID
+        jar = SharedCookieJar()
+        with closing(self._new_session(jar)) as s:
+            resp = self._send(s, 'GET', url,
+                              params={'service': service},
+                              headers=self.headers)
+            e = etree.HTML(resp.text)
+            form = {
+                i.get('name'): i.get('value')
+                for i in e.xpath('//form//input')
+            }
+            form['username'] = username
+            form['password'] = password
+
+            resp = self._send(s, 'POST', url,
+                              params={'service': service},
+                              data=form,
+                              headers=self.headers)
+            ok = self._session_valid(s)
+        if ok:
+            self.jar.replace(jar)
+        self.ok = ok
+        self.cookies = self.jar.get_dict()
+        self.generation += 1
+        self.logged_in_at = time.monotonic()
+        if self.ok and self.cookies_path:
+            self.save_cookies(self.cookies_path)
+
+    def relogin(self, username: str, password: str, service: str, generation: int):
+        '''会话过期后重新登录，同一时间只有一个线程真正发起登录。
+
+        `generation` 是调用方发出请求前读取的 `self.generation`。如果在等待锁期间
+        其他线程已经完成了登录，generation 已经变化，直接返回并使用新的 cookies 重试即可。
+        '''
+        with self._login_lock:
+            if self.generation != generation:
+                return
+            self.login(username, password, service)
+
+    def save_cookies(self, path: str):
+        '''原子地写入 cookies 文件，避免进程中断或多个线程同时保存时留下不完整的文件。'''
+        with self._save_lock:
+            fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.',
+                                            suffix='.tmp', dir=os.path.dirname(path) or '.')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self.cookies, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    def check(self) -> bool:
+        '''用 HEAD 请求检查会话是否有效，只取响应头；服务器不支持 HEAD 时退回到 GET。'''
+        with self.session() as s:
+            self.ok = self._session_valid(s)
+        # 服务器在检查时可能刷新了cookies，及时保存
+        if self.ok and self.cookies_path and self.jar.get_dict() != self.cookies:
+            self.cookies = self.jar.get_dict()
+            self.save_cookies(self.cookies_path)
+        return self.ok
+
+    def _session_valid(self, s: requests.Session) -> bool:
+        resp = self._send(s, 'HEAD', self.check_url, headers=self.headers, allow_redirects=False)
+        if resp.status_code in (405, 501):
+            resp = self._send(s, 'GET', self.check_url, headers=self.headers, allow_redirects=False)
+        return resp.status_code == 200
+
+    def keep_alive(self, username: str, password: str, service: str,
+                   interval: float, max_age: float = 0) -> SessionKeeper:
+        '''启动后台会话保活，替换之前启动的保活线程，参数见 `SessionKeeper`。'''
+        self.stop_keep_alive()
+        self.keeper = SessionKeeper(self, username, password, service, interval, max_age).start()
+        return self.keeper
+
+    def stop_keep_alive(self):
+        if self.keeper is not None:
+            self.keeper.stop()
+            self.keeper = None
+
+    def _send(self, s: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+        '''用借到的 Session 发送请求，并按接口记录延迟、状态码和在途请求数。'''
+        endpoint = metrics.endpoint_name(url)
+        status = 'error'
+        metrics.requests_in_flight.inc(endpoint)
+        start = time.perf_counter()
+        try:
+            resp = getattr(s, method.lower())(url, verify=self.rVerify, **kwargs)
+            status = resp.status_code
+            return resp
+        finally:
+            metrics.observe_request(method, endpoint, status, time.perf_counter() - start)
+            metrics.requests_in_flight.dec(endpoint)
 
     def get(self, url: str, **kwargs):
-        return self.s.get(url, verify=self.rVerify, **kwargs)
+        with self.session() as s:
+            return self._send(s, 'GET', url, **kwargs)
 
     def post(self, url: str, **kwargs):
-        return self.s.post(url, verify=self.rVerify, **kwargs)
+        with self.session() as s:
+            return self._send(s, 'POST', url, **kwargs)
 
     def head(self, url: str, **kwargs):
-        return self.s.head(url, verify=self.rVerify, **kwargs)
+        with self.session() as s:
+            return self._send(s, 'HEAD', url, **kwargs)
+
+    def warm_up(self, url: str, connections: int, **kwargs):
+        '''同时发送 `connections` 个 HEAD 请求，让池中的 Session 都建立好 TLS 连接。'''
+        self.set_pool_size(max(self.pool_size, connections))
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            for f in [executor.submit(self.head, url, **kwargs) for _ in range(connections)]:
+                try:
+                    f.result()
+                except requests.RequestException as e:
+                    print(f'[Warning] Failed to warm up connection: {e}')
+
+    def set_max_inflight(self, n: int):
+        if n == self.max_inflight and self._executor is not None:
+            return
+        old = self._executor
+        self.max_inflight = max(1, n)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_inflight,
+                                            thread_name_prefix='ids')
+        if old is not None:
+            old.shutdown(wait=False)
+
+    async def arun(self, func, *args, **kwargs):
+        '''在请求执行器中运行阻塞函数，供异步选课引擎使用。'''
+        if self._executor is None:
+            self.set_max_inflight(self.max_inflight)
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor,
+                                          partial(func, *args, **kwargs))
+
+    async def alogin(self, username: str, password: str, service: str):
+        return await self.arun(self.login, username, password, service)
+
+    async def arelogin(self, username: str, password: str, service: str, generation: int):
+        return await self.arun(self.relogin, username, password, service, generation)
+
+    async def aget(self, url: str, **kwargs):
+        return await self.arun(self.get, url, **kwargs)
+
+    async def apost(self, url: str, **kwargs):
+        return await self.arun(self.post, url, **kwargs)
+
+    async def ahead(self, url: str, **kwargs):
+        return await self.arun(self.head, url, **kwargs)
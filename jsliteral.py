@@ -0,0 +1,82 @@
+'''EAMS 返回的 JavaScript 对象字面量解析。
+
+`stdElectCourse!data.action` 和 `stdElectCourse!queryStdCount.action` 返回的是
+一段 JavaScript 代码，其中的数据使用 JS 对象字面量书写：键名不加引号、字符串使用单引号、
+允许尾随逗号。这里先用预编译的正则把它改写为标准 JSON，
+然后交给 C 实现的 `json` 解码器逐条解析，不需要再运行完整的 Jsonnet 解释器。
+'''
+import json
+import re
+from typing import Any, Iterator
+
+# 字符串和注释。按它们切分后，偶数位置是代码，奇数位置是字符串或注释
+_string_re = re.compile(r'''('[^'\\]*(?:\\.[^'\\]*)*'|"[^"\\]*(?:\\.[^"\\]*)*"|/\*.*?\*/|//[^\n]*)''', re.S)
+# 代码中的标识符：第1组为键名，第2组为 undefined、NaN 等没有 JSON 对应值的标识符
+_ident_re = re.compile(r'(?<![\w$.])(?:([A-Za-z_$][\w$]*+)(?=\s*:)|((?!(?:true|false|null)\b)[A-Za-z_$][\w$]*+))')
+_trailing_comma_re = re.compile(r',(?=\s*[\]}])')
+_escape_re = re.compile(r'\\(?:x([0-9a-fA-F]{2})|(u[0-9a-fA-F]{4}|["\\/bfnrt])|(\n)|(.))|"', re.S)
+
+_decoder = json.JSONDecoder(strict=False)
+_skip_re = re.compile(r'[\s,]*')
+
+
+def _fix_escape(m: re.Match) -> str:
+    hex_code, json_escape, line_continuation, other = m.groups()
+    if hex_code is not None:
+        return '\\u00' + hex_code
+    if json_escape is not None:
+        return m.group(0)
+    if line_continuation is not None:
+        return ''
+    if other is not None:
+        return other  # 例如 \' 在 JSON 中不需要转义
+    return '\\"'  # 单引号字符串中未转义的双引号
+
+
+def _string(token: str) -> str:
+    if token[0] == '/':
+        return ''  # 注释
+    inner = token[1:-1]
+    if '\\' not in inner and (token[0] == '"' or '"' not in inner):
+        return '"' + inner + '"'
+    return '"' + _escape_re.sub(_fix_escape, inner) + '"'
+
+
+def to_json(text: str) -> str:
+    '''把 JS 对象字面量改写为等价的 JSON 文本。
+
+    只用 C 实现的 `re.split` 切分文本，再在列表上批量替换，避免逐个词法单元回调 Python 函数。
+    '''
+    parts = _string_re.split(text)
+    # 把所有代码片段用 \0 连接起来一次性处理，字符串中的内容不会被误改
+    code = _trailing_comma_re.sub('', '\0'.join(parts[0::2]))
+    pieces = _ident_re.split(code)
+    pieces[1::3] = ['' if key is None else '"' + key + '"' for key in pieces[1::3]]
+    pieces[2::3] = ['' if word is None else 'null' for word in pieces[2::3]]
+    parts[0::2] = ''.join(pieces).split('\0')
+    parts[1::2] = [_string(token) for token in parts[1::2]]
+    return ''.join(parts)
+
+
+def loads(text: str) -> Any:
+    '''解析一个 JS 对象字面量，例如 `{'123':{sc:1,lc:60},}`。'''
+    return _decoder.decode(to_json(text).strip())
+
+
+def iter_array(text: str) -> Iterator[Any]:
+    '''逐个产出 JS 数组字面量中的元素，例如课程列表中的每一门课程。
+
+    Raises:
+        ValueError: 文本中没有数组或数组格式错误。
+    '''
+    doc = to_json(text)
+    start = doc.find('[')
+    if start < 0:
+        raise ValueError('No array literal found.')
+    i = _skip_re.match(doc, start + 1).end()
+    while not doc.startswith(']', i):
+        if i >= len(doc):
+            raise ValueError('Unterminated array literal.')
+        item, i = _decoder.raw_decode(doc, i)
+        yield item
+        i = _skip_re.match(doc, i).end()
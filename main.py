@@ -1,15 +1,60 @@
 import json
-import _jsonnet
+import jsliteral
 import os
-import pandas as pd
 import threading
-from lxml import etree
-from time import sleep
+import exps
+import search
+from time import sleep, perf_counter
 from ids import IdsAuth
+from watcher import CapacityWatcher
+from ratelimit import AdaptiveRateLimiter
+from batcher import ElectionBatcher
+from scheduler import RetryScheduler
+from catalog import CatalogCache
+from timetable import Timetable
+from checkpoint import Checkpoint
+from coalesce import SingleFlight
+from classifier import Classifier, ElectResult, Outcome, extract_messages
+import clock
+import events
+import eventlog
+import exporter
+import metrics
+import envconfig
+
+
+def _fill_envconfig_defaults():
+    '''旧的 `envconfig.py` 缺少后来新增的配置项时，使用 `envconfig.example.py` 中的默认值。'''
+    import runpy
+
+    example = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'envconfig.example.py')
+    if not os.path.exists(example):
+        return
+    for name, value in runpy.run_path(example).items():
+        if not name.startswith('__') and not hasattr(envconfig, name):
+            setattr(envconfig, name, value)
+
+
+_fill_envconfig_defaults()
+
 from envconfig import username, password
 from envconfig import skip_course_list, check_course_availability, sheet_format
 from envconfig import default_courses_exps
 from envconfig import interval, threads_interval
+from envconfig import async_engine, async_max_inflight
+from envconfig import session_pool_size
+from envconfig import session_check_interval, session_max_age
+from envconfig import capacity_watch_interval
+from envconfig import request_rate, max_request_rate
+from envconfig import batch_window, batch_max_size
+from envconfig import retry_scheduling
+from envconfig import scheduled_start, warmup_lead
+from envconfig import metrics_port, metrics_dump_path, metrics_dump_interval
+from envconfig import catalog_cache_path, catalog_ttl
+from envconfig import timetable_check, elected_course_ids
+from envconfig import capture_path
+from envconfig import checkpoint_path
+from envconfig import log_path, log_level, log_sample_interval
 # 新增导入
 from envconfig import ENABLE_RETRY_ON_PERCENTAGE_LIMIT, RETRY_IF_COURSE_FULL_PERCENTAGE_THRESHOLD
 
@@ -25,6 +70,55 @@ headers = {
 host = 'https://jw.shiep.edu.cn'
 service = 'http://jw.shiep.edu.cn/eams/login.action'
 
+# 选课过程的结构化事件日志，由后台线程写出，选课线程不直接写标准输出
+log = eventlog.EventLog(log_path, log_level, log_sample_interval)
+
+# 选课结果消息的分类规则，可以传入自定义的 `classifier.Rule` 列表替换默认规则
+classifier = Classifier()
+
+# 各选课轮次正在运行的课程余量监视器，键为选课轮次ID
+watchers: dict[str, CapacityWatcher] = {}
+
+# 各选课轮次的批量选课处理器，键为选课轮次ID
+batchers: dict[str, ElectionBatcher] = {}
+
+# 各选课轮次的重试调度器，按课程的抢课希望分配重试机会，键为选课轮次ID
+schedulers: dict[str, RetryScheduler] = {}
+
+# 各选课轮次的本地课表，用于在发送请求前排除时间冲突的课程，键为选课轮次ID
+timetables: dict[str, Timetable] = {}
+
+# 课程列表和学期信息的磁盘缓存，catalog_ttl 为0时不缓存
+catalog_cache = CatalogCache(catalog_cache_path, catalog_ttl) if catalog_ttl > 0 else None
+
+# 按 (选课轮次ID, 课程ID) 合并多个表达式对同一门课程的选课，并缓存已经选上的课程
+flights = SingleFlight()
+
+# 课程和表达式最终结果的检查点，重启后从中断的位置继续，checkpoint_path 为空时不记录
+checkpoint = Checkpoint(checkpoint_path) if checkpoint_path else None
+
+# 当前使用的认证对象，由 `login_ids` 创建
+ids: IdsAuth | None = None
+
+# 配置了 capture_path 时录制 `ids` 全部请求的 `capture.Recorder`
+recorder = None
+
+# 所有选课循环共享的自适应限速器，request_rate 为0时使用固定的 interval 间隔
+limiter = AdaptiveRateLimiter(request_rate, max_request_rate or None) if request_rate > 0 else None
+
+
+def get_cached(key: str, url: str, parse, **kwargs):
+    '''发送GET请求并用 `parse` 解析响应。
+
+    启用课程目录缓存时优先读取磁盘缓存，过期后带条件请求头重新验证，见 `catalog.CatalogCache.get`。
+    '''
+    def request(conditional_headers: dict):
+        return ids.get(url, headers={**headers, **conditional_headers}, **kwargs)
+
+    if catalog_cache is None:
+        return parse(request({}))
+    return catalog_cache.get(key, request, parse)
+
 
 def get_elections() -> dict[str, str]:
     '''获取所有可选的选课轮次（选课批次）。
@@ -39,8 +133,14 @@ def get_elections() -> dict[str, str]:
         Exception: 如果获取选课轮次信息失败（例如，网络请求失败或返回状态码非200）。
         Exception: 如果解析到的选课轮次名称数量和ID数量不匹配。
     '''
-    resp = ids.get(f'{host}/eams/stdElectCourse!innerIndex.action?projectId=1',
-                   headers=headers)
+    # 选课轮次随时可能开放或关闭，总是向服务器获取，不使用缓存
+    return _parse_elections(ids.get(f'{host}/eams/stdElectCourse!innerIndex.action?projectId=1',
+                                    headers=headers))
+
+
+def _parse_elections(resp) -> dict[str, str]:
+    from lxml import etree
+
     if resp.status_code != 200:
         raise Exception('Failed to get election profile ids.')
     e = etree.HTML(resp.text)
@@ -74,16 +174,18 @@ def get_courses(e_id: str) -> list[dict]:
     Raises:
         Exception: 如果获取课程列表失败（例如，网络请求失败或返回状态码非200）。
     '''
-    resp = ids.get(f'{host}/eams/stdElectCourse!data.action',
-                   params={'profileId': e_id},
-                   headers=headers)
+    return get_cached(f'courses:{e_id}', f'{host}/eams/stdElectCourse!data.action',
+                      _parse_courses, params={'profileId': e_id})
+
+
+def _parse_courses(resp) -> list[dict]:
     if resp.status_code != 200:
         raise Exception('Failed to get course list.')
     dat = resp.text  # 响应内容是包含课程数据的JavaScript代码片段
-    # 从JavaScript代码片段中提取JSON数组部分
+    # 从JavaScript代码片段中提取数组部分
     dat = dat[dat.find('['):dat.rfind(']') + 1]
-    # 使用_jsonnet解析JavaScript对象表示的课程数据
-    return json.loads(_jsonnet.evaluate_snippet('snippet', dat))
+    # 逐条解析JavaScript对象表示的课程数据
+    return list(jsliteral.iter_array(dat))
 
 
 def get_semester_info(e_id: str) -> dict:
@@ -100,9 +202,13 @@ def get_semester_info(e_id: str) -> dict:
     Raises:
         Exception: 如果获取学期信息失败。
     '''
-    resp = ids.get(f'{host}/eams/stdElectCourse!defaultPage.action',
-                   params={'electionProfile.id': e_id},
-                   headers=headers)
+    return get_cached(f'semester:{username}:{e_id}', f'{host}/eams/stdElectCourse!defaultPage.action',
+                      _parse_semester_info, params={'electionProfile.id': e_id})
+
+
+def _parse_semester_info(resp) -> dict:
+    from lxml import etree
+
     if resp.status_code != 200:
         raise Exception('Failed to get semester info.')
     e = etree.HTML(resp.text)
@@ -136,10 +242,10 @@ def get_courses_status(params: dict) -> dict:
     if resp.status_code != 200:
         raise Exception('Failed to get course status.')
     dat = resp.text  # 响应内容是包含课程状态的JavaScript代码片段
-    # 从JavaScript代码片段中提取JSON对象部分
+    # 从JavaScript代码片段中提取对象部分
     dat = dat[dat.find('{'):dat.rfind('}') + 1]
-    # 使用_jsonnet解析JavaScript对象表示的课程状态数据
-    return json.loads(_jsonnet.evaluate_snippet('snippet', dat))
+    # 解析JavaScript对象表示的课程状态数据
+    return jsliteral.loads(dat)
 
 
 def head_election(e_id: str):
@@ -157,7 +263,40 @@ def head_election(e_id: str):
              headers=headers)
 
 
-def elect_course(course_id: str, e_id: str, courses_status_data: dict | None = None) -> list:
+def report_outcome(result: ElectResult):
+    '''根据选课结果向限速器反馈服务器的负载情况。'''
+    if limiter is None or result.outcome is Outcome.EXPIRED:
+        return
+    if result.outcome is Outcome.THROTTLED:
+        limiter.on_throttle()
+    elif result.outcome is Outcome.SERVER_ERROR:
+        limiter.on_overload()
+    else:
+        limiter.on_success()
+
+
+def record_outcomes(results: list[ElectResult]):
+    for result in results:
+        metrics.elect_outcomes.inc(result.outcome)
+
+
+def _elect_request(course_ids: list[str], e_id: str) -> tuple[str, dict]:
+    '''构造选课请求的URL和参数，供同步和异步选课共用。'''
+    # 选课请求通常需要这个特殊的请求头
+    headers_with_ajax = headers.copy()
+    headers_with_ajax['X-Requested-With'] = 'XMLHttpRequest'
+    data = {'optype': 'true'}  # 操作类型，true表示选课
+    for i, course_id in enumerate(course_ids):
+        data[f'operator{i}'] = f'{course_id}:true:0'  # 选课参数格式：课程ID:true:0
+    return f'{host}/eams/stdElectCourse!batchOperator.action', {
+        'params': {'profileId': e_id},
+        'headers': headers_with_ajax, # 使用包含 AJAX 标志的请求头
+        'data': data,
+        'allow_redirects': False, # 选课操作通常不应发生重定向
+    }
+
+
+def elect_course(course_id: str, e_id: str, courses_status_data: dict | None = None) -> ElectResult:
     '''执行单个课程的选课操作。
 
     Args:
@@ -169,279 +308,894 @@ def elect_course(course_id: str, e_id: str, courses_status_data: dict | None = N
                                                      Defaults to None.
 
     Returns:
-        list: 包含选课结果信息的列表：
+        ElectResult: 选课结果，包含以下字段：
               - course_id (str): 尝试选课的课程ID。
-              - message (str): 选课操作返回的消息。
+              - msg (str): 选课操作返回的消息。
               - succeeded (bool): 选课是否成功。
               - retry (bool): 是否需要重试该课程。
+              - outcome (Outcome): 结果类别，例如课程已满、时间冲突、被限流。
     
     Raises:
         Exception: 如果发生客户端错误（如4xx状态码），表明请求本身有问题。
                    对于服务器端错误或可重试的错误，会通过返回值的 `retry` 标志来处理。
     '''
-    # 选课请求通常需要这个特殊的请求头
-    headers_with_ajax = headers.copy()
-    headers_with_ajax['X-Requested-With'] = 'XMLHttpRequest'
-    resp = ids.post(f'{host}/eams/stdElectCourse!batchOperator.action',
-                    params={'profileId': e_id},
-                    headers=headers_with_ajax, # 使用包含 AJAX 标志的请求头
-                    data={
-                        'optype': 'true',  # 操作类型，true表示选课
-                        'operator0': f'{course_id}:true:0'  # 选课参数格式：课程ID:true:0
-                    },
-                    allow_redirects=False) # 选课操作通常不应发生重定向
+    return elect_courses([course_id], e_id, courses_status_data)[0]
+
+
+def elect_courses(course_ids: list[str], e_id: str, courses_status_data: dict | None = None) -> list[ElectResult]:
+    '''在一个批量选课请求中同时选择多门课程。
+
+    Args:
+        course_ids (list[str]): 要选择的课程ID，依次作为 operator0..operatorN 发送。
+        e_id (str): 当前选课轮次的ID。
+        courses_status_data (dict | None, optional): 同 `elect_course`。
+
+    Returns:
+        list[ElectResult]: 与 `course_ids` 一一对应的结果列表，格式同 `elect_course` 的返回值。
+
+    Raises:
+        Exception: 如果发生客户端错误（如4xx状态码）。
+    '''
+    url, kwargs = _elect_request(course_ids, e_id)
+    generation = ids.generation
+    resp = ids.post(url, **kwargs)
 
     # 处理会话过期的情况
     if '会话已经被过期' in resp.text:
-        print("会话过期，尝试重新登录...")
-        ids.login(username, password, service) # 重新登录
-        return [course_id, '会话已经被过期', False, True] # 返回并标记需要重试
+        log.warning('session_expired', '会话过期，尝试重新登录...', e_id=e_id, course_ids=course_ids)
+        ids.relogin(username, password, service, generation) # 重新登录，多个线程同时过期时只登录一次
+        results = [ElectResult(course_id, '会话已经被过期', False, True, Outcome.EXPIRED)
+                   for course_id in course_ids] # 标记需要重试
+    else:
+        results = _parse_elect_response(course_ids, resp, courses_status_data)
+    record_outcomes(results)
+    return results
+
 
+# 针对整个请求而不是某门课程的结果，批量请求只返回一条这样的消息时适用于所有课程
+_request_outcomes = (Outcome.THROTTLED, Outcome.SERVER_ERROR, Outcome.EXPIRED)
+
+
+def _parse_elect_response(course_ids: list[str], resp, courses_status_data: dict | None) -> list[ElectResult]:
+    '''解析选课响应，返回与 `course_ids` 一一对应的结果列表。'''
     # 处理非200状态码
     if resp.status_code != 200:
         if str(resp.status_code).startswith('4'): # 客户端错误，通常不可重试
-            raise Exception(f'Failed to elect course {course_id}. Status: {resp.status_code}. Response: {resp.text}')
+            raise Exception(f'Failed to elect courses {course_ids}. Status: {resp.status_code}. Response: {resp.text}')
         else: # 其他错误（如服务器5xx错误），可能可以重试
-            return [course_id, f'Server error: {str(resp.status_code)}', False, True]
+            return [ElectResult(course_id, f'Server error: {str(resp.status_code)}', False, True, Outcome.SERVER_ERROR)
+                    for course_id in course_ids]
+
+    # 解析选课结果消息，结果表格中每一行对应一个 operatorN
+    msgs = extract_messages(resp.text)
+    if len(msgs) == 0:
+        msgs = [resp.text] # 如果路径找不到，使用完整响应文本
+    if len(msgs) == 1 and len(course_ids) > 1:
+        first = _classify_elect_msg(course_ids[0], msgs[0], courses_status_data)
+        if first.outcome in _request_outcomes:
+            msgs = msgs * len(course_ids) # 针对整个请求的消息（如“请不要过快点击”）适用于所有课程
+    if len(msgs) < len(course_ids):
+        # 结果行数与请求的课程数不一致，无法确定缺少的是哪门课程的结果，缺少的部分标记为失败并重试
+        msgs += ['批量选课结果解析失败'] * (len(course_ids) - len(msgs))
+    return [_classify_elect_msg(course_id, msg, courses_status_data)
+            for course_id, msg in zip(course_ids, msgs)]
+
+
+def _classify_elect_msg(course_id: str, msg: str, courses_status_data: dict | None) -> ElectResult:
+    '''根据选课结果消息判断是否成功以及是否需要重试。
+
+    没有命中任何规则的消息视为成功；课程已满时只有启用了百分比重试并且已选人数未超过阈值才重试。
+    '''
+    result = classifier.classify(course_id, msg)
+    if result.outcome is Outcome.FULL:
+        result = result._replace(retry=_retry_full_course(course_id, courses_status_data))
+    return result
+
+
+def _retry_full_course(course_id: str, courses_status_data: dict | None) -> bool:
+    '''课程已满时，根据已选人数/课容量与 `RETRY_IF_COURSE_FULL_PERCENTAGE_THRESHOLD` 判断是否继续重试。'''
+    if not ENABLE_RETRY_ON_PERCENTAGE_LIMIT or courses_status_data is None:
+        # 百分比重试功能未启用或课程状态数据未提供，对于满员消息不重试
+        return False
+    course_specific_status = courses_status_data.get(str(course_id))
+    if not course_specific_status:
+        # 未找到该课程的状态信息，对于满员消息不重试
+        log.warning('full_retry_check', "[Warning] Course status for {course_id} not found for percentage check. Not retrying for fullness.",
+                    sample=(course_id, 'full_retry_check'), course_id=course_id)
+        return False
+    sc = course_specific_status.get('sc', 0)  # selected count
+    lc = course_specific_status.get('lc', 0)  # limit capacity
+    if lc <= 0: # 课容量为0或无效，对于满员消息不重试
+        return False
+    current_percentage = (float(sc) / lc) * 100
+    retry = current_percentage <= RETRY_IF_COURSE_FULL_PERCENTAGE_THRESHOLD # 等于或低于阈值时重试，超过阈值不因满员而重试
+    log.info('full_retry_check',
+             "[Info] Course {course_id} full ({percentage:.2f}%), but at or below threshold {threshold}%. Retrying." if retry else
+             "[Info] Course {course_id} full ({percentage:.2f}%) and above threshold {threshold}%. Not retrying for fullness.",
+             sample=(course_id, 'full_retry_check'), course_id=course_id, percentage=current_percentage,
+             threshold=RETRY_IF_COURSE_FULL_PERCENTAGE_THRESHOLD, retry=retry)
+    return retry
+
+
+async def async_elect_course(course_id: str, e_id: str, courses_status_data: dict | None = None) -> ElectResult:
+    '''`elect_course` 的异步版本，参数和返回值与之相同。'''
+    return (await async_elect_courses([course_id], e_id, courses_status_data))[0]
+
+
+async def async_elect_courses(course_ids: list[str], e_id: str, courses_status_data: dict | None = None) -> list[ElectResult]:
+    '''`elect_courses` 的异步版本，参数和返回值与之相同。
+
+    阻塞的HTTP请求交给 `IdsAuth` 的请求执行器完成，事件循环本身不会被阻塞。
+    '''
+    url, kwargs = _elect_request(course_ids, e_id)
+    generation = ids.generation
+    resp = await ids.apost(url, **kwargs)
 
-    # 解析选课结果消息
-    e = etree.HTML(resp.text)
-    msgs = e.xpath('//table/tr[1]/td/div/text()') # 尝试从特定路径提取消息
-    msg = msgs[0].strip() if len(msgs) > 0 else resp.text # 如果路径找不到，使用完整响应文本
+    # 处理会话过期的情况
+    if '会话已经被过期' in resp.text:
+        log.warning('session_expired', '会话过期，尝试重新登录...', e_id=e_id, course_ids=course_ids)
+        await ids.arelogin(username, password, service, generation) # 重新登录，多个任务同时过期时只登录一次
+        results = [ElectResult(course_id, '会话已经被过期', False, True, Outcome.EXPIRED)
+                   for course_id in course_ids] # 标记需要重试
+    else:
+        results = _parse_elect_response(course_ids, resp, courses_status_data)
+    record_outcomes(results)
+    return results
 
-    # 简化常见的提示信息
-    simplified_msgs = [
-        '请不要过快点击',
-        '服务器内部错误',
-    ]
-    for simplified_msg in simplified_msgs:
-        if simplified_msg in msg:
-            msg = simplified_msg
-            break # 一旦匹配到简化消息，就使用它
-
-    # 判断选课是否成功以及是否需要重试
-    if '已经选过' in msg or '已选上' in msg: # 明确成功的标志
-        return [course_id, msg, True, False]
-
-    # --- 开始重构succeeded和retry的判断逻辑 ---
-    course_fullness_keywords = ['上限', '已满', '已达', '已经达到']
-    hard_fail_keywords = ['冲突'] # 例如选课时间冲突等，通常不可通过重试解决
-    general_error_keywords = ['失败', '错误', 'fail', 'error', '503', '过快点击', '服务器内部错误'] # 其他可能重试的错误
-
-    # 检查消息中是否包含任何负面关键词
-    all_negative_keywords = course_fullness_keywords + hard_fail_keywords + general_error_keywords
-    
-    # 如果消息中不包含任何已知的负面关键词，我们可能认为它是成功的（或者至少不是明确的失败）
-    # 注意：原始逻辑是只要没有error_words就succeeded=True。这里保持类似行为。
-    # 如果msg是空或者未知信息，且不含error words，则succeeded为True。
-    succeeded = not any(keyword in msg for keyword in all_negative_keywords)
-
-    if succeeded:
-        # 如果根据关键词判断没有发生错误/满员/冲突，则认为操作成功，不需重试。
-        # 这也覆盖了那些非明确成功提示（如“已选上”）但也没有错误的操作。
-        return [course_id, msg, True, False]
-
-    # 至此，succeeded 为 False，意味着消息中包含某种负面关键词。
-    # 现在决定是否需要重试。默认对于失败情况不重试，除非特定逻辑允许。
-    retry = False
-
-    is_course_full_msg = any(fw in msg for fw in course_fullness_keywords)
-
-    if is_course_full_msg:
-        # 检测到课程已满相关的消息
-        if ENABLE_RETRY_ON_PERCENTAGE_LIMIT and courses_status_data is not None:
-            course_specific_status = courses_status_data.get(str(course_id))
-            if course_specific_status:
-                sc = course_specific_status.get('sc', 0)  # selected count
-                lc = course_specific_status.get('lc', 0)  # limit capacity
-                if lc > 0: # 避免除以零
-                    current_percentage = (float(sc) / lc) * 100
-                    # 修改这里的条件，从 < 改为 <=
-                    if current_percentage <= RETRY_IF_COURSE_FULL_PERCENTAGE_THRESHOLD:
-                        print(f"[Info] Course {course_id} full ({current_percentage:.2f}%), but at or below threshold {RETRY_IF_COURSE_FULL_PERCENTAGE_THRESHOLD}%. Retrying.")
-                        retry = True # 等于或低于阈值，重试
-                    else:
-                        print(f"[Info] Course {course_id} full ({current_percentage:.2f}%) and above threshold {RETRY_IF_COURSE_FULL_PERCENTAGE_THRESHOLD}%. Not retrying for fullness.")
-                        retry = False # 超过阈值，不因满员而重试
-                else:
-                    # 课容量为0或无效，对于满员消息不重试
-                    retry = False
-            else:
-                # 未找到该课程的状态信息，对于满员消息不重试
-                print(f"[Warning] Course status for {course_id} not found for percentage check. Not retrying for fullness.")
-                retry = False
-        else:
-            # 百分比重试功能未启用或课程状态数据未提供，对于满员消息不重试
-            retry = False
-    elif any(hfk in msg for hfk in hard_fail_keywords):
-        # 是硬性失败（如“冲突”），不重试
-        retry = False
-    elif any(gek in msg for gek in general_error_keywords):
-        # 是其他一般性错误（如“服务器内部错误”，“过快点击”），这些通常是可重试的
-        retry = True
-    # 如果消息不匹配任何已知模式，但之前被判断为succeeded=False，默认retry=False
 
-    return [course_id, msg, succeeded, retry]
-    # --- 结束succeeded和retry的判断逻辑 ---
+def attempt_course(course_id: str, e_id: str, courses_status_data: dict | None, paced: bool = False) -> ElectResult:
+    '''发送一次选课尝试：启用批量选课时交给批处理器合并发送，否则单独发送。
 
+    Args:
+        paced (bool, optional): 重试调度器已经取得了限速令牌，单独发送时不再获取。Defaults to False.
 
-def parse_courses_exp(exp: str, e_id: str, original_exp_for_thread: str, courses_status_data: dict | None) -> list:
-    '''解析并执行课程选择表达式。
+    Returns:
+        ElectResult: 选课结果，格式同 `elect_course` 函数的返回值。
+    '''
+    batcher = batchers.get(e_id)
+    if batcher is not None:
+        return batcher.submit(course_id)
+    if limiter is not None and not paced:
+        limiter.acquire()
+    result = elect_course(course_id, e_id, courses_status_data)
+    report_outcome(result)
+    return result
+
+
+async def async_attempt_course(course_id: str, e_id: str, courses_status_data: dict | None, paced: bool = False) -> ElectResult:
+    '''`attempt_course` 的异步版本。'''
+    batcher = batchers.get(e_id)
+    if batcher is not None:
+        return await batcher.asubmit(course_id)
+    if limiter is not None and not paced:
+        await limiter.aacquire()
+    result = await async_elect_course(course_id, e_id, courses_status_data)
+    report_outcome(result)
+    return result
+
+
+def _send_batch(course_ids: list[str], e_id: str, courses_status_data: dict | None) -> list[ElectResult]:
+    '''批处理器发送一批选课请求，每个批量请求只消耗一个限速令牌。'''
+    watcher = watchers.get(e_id)
+    if watcher is not None:
+        courses_status_data = watcher.data
+    if limiter is not None:
+        limiter.acquire()
+    results = elect_courses(course_ids, e_id, courses_status_data)
+    report_outcome(results[0]) # 限流和服务器错误针对整个请求，任取一条结果反馈即可
+    return results
+
+
+_attempt_messages = {
+    tag: f'[{tag} for: {{exp}}] {{course_id}}: {{msg}} (succeeded:{{succeeded}}, retry:{{retry}})'
+    for tag in ('Thread', 'Task')
+}
+
+
+def _report_attempt(tag: str, e_id: str, exp: str, result: ElectResult, latency: float, attempt: int):
+    '''记录一次选课尝试，需要重试的同类结果按 `log_sample_interval` 抽样。'''
+    events.publish('attempt', e_id=e_id, exp=exp, course_id=result.course_id, msg=result.msg,
+                   outcome=result.outcome, succeeded=result.succeeded, retry=result.retry, latency=latency)
+    log.info('attempt', _attempt_messages[tag],
+             sample=(e_id, exp, result.course_id, result.outcome) if result.retry else None,
+             e_id=e_id, exp=exp, course_id=result.course_id, outcome=result.outcome, msg=result.msg,
+             succeeded=result.succeeded, retry=result.retry, latency=round(latency, 6), attempt=attempt)
+
+
+def _local_conflict(course_id: str, e_id: str, exp: str) -> ElectResult:
+    '''课程与本轮已经选上的课程时间冲突，不发送请求直接返回失败。'''
+    result = ElectResult(course_id, '与已选课程时间冲突（本地检查）', False, False, Outcome.CONFLICT)
+    log.info('local_conflict', '[Info] Skipping {course_id} in {exp!r}: {msg}',
+             e_id=e_id, exp=exp, course_id=course_id, outcome=result.outcome, msg=result.msg)
+    events.publish('attempt', e_id=e_id, exp=exp, course_id=course_id, msg=result.msg,
+                   outcome=result.outcome, succeeded=False, retry=False, latency=0.0)
+    return result
 
-    表达式支持以下操作符：
-    - ';' (分号): 顺序执行，无论前一个是否成功，都会执行下一个。返回最后一个操作的结果。
-    - '|' (竖线): 或操作，从左到右尝试，一旦成功则停止并返回成功结果。如果都失败，返回最后一个的失败结果。
-    - '&' (与号): 与操作，从左到右尝试，一旦失败则停止并返回失败结果。如果都成功，返回最后一个的成功结果。
-    单个课程ID会直接尝试选课，并根据结果进行重试。
+
+def elect_course_until_done(course_id: str, e_id: str, original_exp_for_thread: str, courses_status_data: dict | None,
+                            position: int = 0) -> ElectResult:
+    '''对单个课程反复选课，直到 `elect_course` 表示不需要重试为止。
+
+    多个表达式同时选同一门课程时只有一个线程发送请求，其他线程等待并得到相同的结果；
+    本轮已经选上的课程直接返回缓存的结果。启用重试调度器时，重试由调度器按课程的权重放行，
+    `position` 为课程在表达式的“或”运算中的位置，见 `exps.or_positions`。
+
+    Returns:
+        ElectResult: 最后一次尝试的结果，格式同 `elect_course` 函数的返回值。
+    '''
+    return flights.do((e_id, course_id), lambda: _elect_course_until_done(
+        course_id, e_id, original_exp_for_thread, courses_status_data, position))
+
+
+def _elect_course_until_done(course_id: str, e_id: str, original_exp_for_thread: str, courses_status_data: dict | None,
+                             position: int) -> ElectResult:
+    recorded = checkpoint.course_result(username, e_id, course_id) if checkpoint is not None else None
+    if recorded is not None: # 重启前已经有最终结果，不再发送请求
+        log.info('resumed', '[Thread for: {exp}] {course_id}: {msg} (resumed from checkpoint)',
+                 e_id=e_id, exp=original_exp_for_thread, course_id=course_id, outcome=recorded.outcome, msg=recorded.msg)
+        return recorded
+    watcher = watchers.get(e_id)
+    timetable = timetables.get(e_id)
+    scheduler = schedulers.get(e_id)
+    attempt = 0
+    paced = False
+    while True:
+        if watcher is not None:
+            version = watcher.version
+            courses_status_data = watcher.data # 使用监视器的最新快照判断满员是否值得重试
+        if timetable is not None and timetable.conflicts(course_id):
+            return _local_conflict(course_id, e_id, original_exp_for_thread)
+        started = perf_counter()
+        final_result = attempt_course(course_id, e_id, courses_status_data, paced)
+        attempt += 1
+        # 记录当前尝试的结果，并带上线程信息
+        _report_attempt('Thread', e_id, original_exp_for_thread, final_result, perf_counter() - started, attempt)
+        if timetable is not None and final_result.succeeded:
+            timetable.add(course_id)
+        if scheduler is not None:
+            scheduler.report(course_id, final_result.outcome)
+
+        if not final_result.retry: # 如果不需要重试（无论成功或失败），则返回
+            if checkpoint is not None:
+                checkpoint.record_course(username, e_id, final_result)
+            return final_result
+        paced = False
+        if watcher is not None and final_result.outcome is Outcome.FULL:
+            watcher.wait_for_seat(course_id, version) # 课程已满时等待监视器报告出现空位
+        elif scheduler is not None:
+            paced = scheduler.wait_turn(course_id, position) # 与其他课程一起排队，按权重轮到时再重试
+        elif limiter is None:
+            sleep(interval) # 如果需要重试，则等待一段时间；启用限速器时由限速器控制节奏
+
+
+def run_courses_plan(plan: exps.Node, e_id: str, original_exp_for_thread: str, courses_status_data: dict | None) -> ElectResult:
+    '''执行已编译的选课表达式。
 
     Args:
-        exp (str): 要解析的课程表达式字符串。
+        plan (exps.Node): 由 `exps.compile_exp` 编译得到的表达式。
         e_id (str): 当前选课轮次的ID。
         original_exp_for_thread (str): 用于日志记录的原始表达式字符串，以区分线程。
         courses_status_data (dict | None): 当前选课轮次所有课程的状态数据，用于特定重试逻辑。
 
     Returns:
-        list: 选课结果列表，格式同 `elect_course` 函数的返回值。
+        ElectResult: 选课结果，格式同 `elect_course` 函数的返回值。
               对于组合表达式，返回的是最终决定该表达式成功或失败的那个子表达式或课程的结果。
+
+    启用检查点时，重启前已经结束的表达式直接返回记录的结果，已有最终结果的课程不再发送请求。
     '''
-    # 处理 ';' (顺序) 操作符
-    if ';' in exp:
-        results = [parse_courses_exp(sub_exp, e_id, original_exp_for_thread, courses_status_data) for sub_exp in exp.split(';')]
-        return results[-1] # 返回最后一个表达式的结果
-
-    # 处理 '|' (或) 操作符
-    if '|' in exp:
-        last_result = []
-        for sub_exp in exp.split('|'):
-            expr_result, msg_result, succeeded_result, retry_result = parse_courses_exp(sub_exp, e_id, original_exp_for_thread, courses_status_data)
-            last_result = [expr_result, msg_result, succeeded_result, retry_result]
-            if succeeded_result:
-                return last_result # 一旦成功，立即返回
-        return last_result # 如果所有 '或' 条件都失败，返回最后一个尝试的结果
-
-    # 处理 '&' (与) 操作符
-    if '&' in exp:
-        # overall_succeeded = True # Not directly used, result determined by last_result or early exit
-        last_result = [] # Stores the result of the latest sub-expression
-        sub_expressions = exp.split('&')
-        for sub_exp in sub_expressions:
-            expr_result, msg_result, succeeded_result, retry_result = parse_courses_exp(sub_exp, e_id, original_exp_for_thread, courses_status_data)
-            last_result = [expr_result, msg_result, succeeded_result, retry_result] # 记录当前子表达式的结果
-            if not succeeded_result:
-                # overall_succeeded = False # Not strictly needed due to early return
-                return last_result # 一旦失败，立即返回该失败结果
-        # 如果所有 '&' 条件都成功，返回最后一个（也是成功的）结果
-        return last_result
-
-
-    # 基本情况：单个课程ID，尝试选课并处理重试
-    # 此时的 exp 应该是单个课程ID
-    current_retry = True
-    final_result = []
-    while current_retry:
-        # elect_course 返回 [course_id, message, succeeded?, retry?]
-        expr_val, msg_val, succeeded_val, retry_val = elect_course(exp, e_id, courses_status_data)
-        final_result = [expr_val, msg_val, succeeded_val, retry_val]
-        current_retry = retry_val # 更新重试状态
-
-        # 打印当前尝试的结果，并带上线程信息
-        print(f'[Thread for: {original_exp_for_thread}] {expr_val}: {msg_val} (succeeded:{succeeded_val}, retry:{current_retry})')
-        
-        if current_retry: # 如果需要重试，则等待一段时间
-            sleep(interval)
-        else: # 如果不需要重试（无论成功或失败），则跳出循环
+    recorded = checkpoint.plan_result(username, e_id, original_exp_for_thread) if checkpoint is not None else None
+    if recorded is not None:
+        log.info('plan_resumed', '[Info] {exp} already finished before restart: {msg}',
+                 e_id=e_id, exp=original_exp_for_thread, outcome=recorded.outcome, msg=recorded.msg)
+        events.publish('plan_finished', e_id=e_id, exp=original_exp_for_thread, result=recorded)
+        return recorded
+    events.publish('plan_started', e_id=e_id, exp=original_exp_for_thread)
+    positions = exps.or_positions(plan)
+    try:
+        result = exps.evaluate(plan, lambda course_id: elect_course_until_done(
+            course_id, e_id, original_exp_for_thread, courses_status_data, positions[course_id]))
+    except Exception as e:
+        events.publish('plan_failed', e_id=e_id, exp=original_exp_for_thread, error=str(e))
+        raise
+    events.publish('plan_finished', e_id=e_id, exp=original_exp_for_thread, result=result)
+    if checkpoint is not None:
+        checkpoint.record_plan(username, e_id, original_exp_for_thread, result)
+    return result
+
+
+def parse_courses_exp(exp: str, e_id: str, original_exp_for_thread: str, courses_status_data: dict | None) -> ElectResult:
+    '''编译并执行课程选择表达式，语法见 `exps` 模块。
+
+    Args:
+        exp (str): 要执行的课程表达式字符串。
+        e_id (str): 当前选课轮次的ID。
+        original_exp_for_thread (str): 用于日志记录的原始表达式字符串，以区分线程。
+        courses_status_data (dict | None): 当前选课轮次所有课程的状态数据，用于特定重试逻辑。
+
+    Returns:
+        ElectResult: 选课结果，格式同 `elect_course` 函数的返回值。
+    '''
+    return run_courses_plan(exps.compile_exp(exp), e_id, original_exp_for_thread, courses_status_data)
+
+
+async def async_elect_course_until_done(course_id: str, e_id: str, original_exp_for_thread: str, courses_status_data: dict | None,
+                                        position: int = 0) -> ElectResult:
+    '''`elect_course_until_done` 的异步版本，重试之间使用 `asyncio.sleep` 等待。'''
+    return await flights.ado((e_id, course_id), lambda: _async_elect_course_until_done(
+        course_id, e_id, original_exp_for_thread, courses_status_data, position))
+
+
+async def _async_elect_course_until_done(course_id: str, e_id: str, original_exp_for_thread: str, courses_status_data: dict | None,
+                                         position: int) -> ElectResult:
+    import asyncio
+
+    recorded = checkpoint.course_result(username, e_id, course_id) if checkpoint is not None else None
+    if recorded is not None: # 重启前已经有最终结果，不再发送请求
+        log.info('resumed', '[Task for: {exp}] {course_id}: {msg} (resumed from checkpoint)',
+                 e_id=e_id, exp=original_exp_for_thread, course_id=course_id, outcome=recorded.outcome, msg=recorded.msg)
+        return recorded
+    watcher = watchers.get(e_id)
+    timetable = timetables.get(e_id)
+    scheduler = schedulers.get(e_id)
+    attempt = 0
+    paced = False
+    while True:
+        if watcher is not None:
+            version = watcher.version
+            courses_status_data = watcher.data
+        if timetable is not None and timetable.conflicts(course_id):
+            return _local_conflict(course_id, e_id, original_exp_for_thread)
+        started = perf_counter()
+        final_result = await async_attempt_course(course_id, e_id, courses_status_data, paced)
+        attempt += 1
+        _report_attempt('Task', e_id, original_exp_for_thread, final_result, perf_counter() - started, attempt)
+        if timetable is not None and final_result.succeeded:
+            timetable.add(course_id)
+        if scheduler is not None:
+            scheduler.report(course_id, final_result.outcome)
+        if not final_result.retry:
+            if checkpoint is not None:
+                checkpoint.record_course(username, e_id, final_result)
+            return final_result
+        paced = False
+        if watcher is not None and final_result.outcome is Outcome.FULL:
+            await watcher.await_seat(course_id, version)
+        elif scheduler is not None:
+            paced = await scheduler.await_turn(course_id, position)
+        elif limiter is None:
+            await asyncio.sleep(interval)
+
+
+async def async_run_courses_plan(plan: exps.Node, e_id: str, original_exp_for_thread: str, courses_status_data: dict | None) -> ElectResult:
+    '''`run_courses_plan` 的异步版本，表达式语义和返回值与之相同。'''
+    recorded = checkpoint.plan_result(username, e_id, original_exp_for_thread) if checkpoint is not None else None
+    if recorded is not None:
+        log.info('plan_resumed', '[Info] {exp} already finished before restart: {msg}',
+                 e_id=e_id, exp=original_exp_for_thread, outcome=recorded.outcome, msg=recorded.msg)
+        events.publish('plan_finished', e_id=e_id, exp=original_exp_for_thread, result=recorded)
+        return recorded
+    events.publish('plan_started', e_id=e_id, exp=original_exp_for_thread)
+    positions = exps.or_positions(plan)
+    try:
+        result = await exps.aevaluate(plan, lambda course_id: async_elect_course_until_done(
+            course_id, e_id, original_exp_for_thread, courses_status_data, positions[course_id]))
+    except Exception as e:
+        events.publish('plan_failed', e_id=e_id, exp=original_exp_for_thread, error=str(e))
+        raise
+    events.publish('plan_finished', e_id=e_id, exp=original_exp_for_thread, result=result)
+    if checkpoint is not None:
+        checkpoint.record_plan(username, e_id, original_exp_for_thread, result)
+    return result
+
+
+def _fetch_retry_status(e_id: str) -> dict | None:
+    '''获取用于满员百分比重试判断的课程状态快照，未启用或失败时返回 None。'''
+    if not ENABLE_RETRY_ON_PERCENTAGE_LIMIT:
+        return None
+    try:
+        print(f"[Info] Fetching course status for election {e_id} for percentage-based retry logic...")
+        semester_params = get_semester_info(e_id)
+        courses_status_data = get_courses_status(semester_params)
+        print(f"[Info] Successfully fetched course status for election {e_id}.")
+        return courses_status_data
+    except Exception as e:
+        print(f"[Warning] Could not fetch course status for election {e_id} (used for percentage-based retry): {e}")
+        print("[Warning] Percentage-based retry for full courses will effectively be disabled for this round.")
+        return None
+
+
+def start_capacity_watcher(e_id: str) -> CapacityWatcher | None:
+    '''按 `capacity_watch_interval` 启动选课轮次的课程余量监视器，未启用或启动失败时返回 None。'''
+    if capacity_watch_interval <= 0:
+        return None
+    try:
+        semester_params = get_semester_info(e_id)
+        watcher = CapacityWatcher(lambda: get_courses_status(semester_params), capacity_watch_interval)
+        watcher.start()
+    except Exception as e:
+        print(f"[Warning] Could not start capacity watcher for election {e_id}: {e}")
+        return None
+    watchers[e_id] = watcher
+    return watcher
+
+
+def stop_capacity_watcher(e_id: str):
+    watcher = watchers.pop(e_id, None)
+    if watcher is not None:
+        watcher.stop()
+
+
+def start_batcher(e_id: str, courses_status_data: dict | None) -> ElectionBatcher | None:
+    '''按 `batch_window` 为选课轮次启动批量选课处理器，未启用时返回 None。'''
+    if batch_window <= 0:
+        return None
+    batcher = ElectionBatcher(lambda course_ids: _send_batch(course_ids, e_id, courses_status_data),
+                              batch_window, batch_max_size)
+    batchers[e_id] = batcher
+    return batcher
+
+
+def stop_batcher(e_id: str):
+    batcher = batchers.pop(e_id, None)
+    if batcher is not None:
+        batcher.close()
+
+
+def start_scheduler(e_id: str, courses_status_data: dict | None) -> RetryScheduler | None:
+    '''按 `retry_scheduling` 为选课轮次启动重试调度器，未启用时返回 None。
+
+    权重使用课程余量监视器的实时快照；没有监视器时使用开始时获取的一次课程状态。
+    '''
+    if not retry_scheduling:
+        return None
+    if e_id not in watchers and courses_status_data is None:
+        try:
+            courses_status_data = get_courses_status(get_semester_info(e_id))
+        except Exception as e:
+            print(f"[Warning] Could not fetch course status for election {e_id}, retries will not be weighted by capacity: {e}")
+    if limiter is None:
+        reserve = None
+    elif e_id in batchers:
+        # 批处理器发送时自己获取限速令牌，调度器只按限速器的当前速率放行
+        reserve = lambda: 1 / limiter.rate
+    else:
+        reserve = limiter.reserve
+    scheduler = RetryScheduler(lambda: watchers[e_id].data if e_id in watchers else courses_status_data,
+                               interval, reserve)
+    schedulers[e_id] = scheduler
+    return scheduler
+
+
+def stop_scheduler(e_id: str):
+    scheduler = schedulers.pop(e_id, None)
+    if scheduler is not None:
+        scheduler.close()
+
+
+def start_metrics():
+    '''按配置启动指标的 Prometheus 接口和定期 JSON 导出。'''
+    if metrics_port > 0:
+        metrics.serve(metrics_port)
+        print(f"[Info] Metrics available at http://127.0.0.1:{metrics_port}/metrics")
+    if metrics_dump_path:
+        metrics.start_dump(metrics_dump_path, metrics_dump_interval)
+
+
+def server_date() -> str | None:
+    '''发送一次轻量的 HEAD 请求，返回教务系统响应的 `Date` 头。'''
+    return ids.head(f'{host}/eams/home.action', headers=headers, allow_redirects=False).headers.get('Date')
+
+
+def scheduled_start_for(e_id: str) -> str:
+    '''返回选课轮次的定时开始时间。`scheduled_start` 可以是所有轮次共用的字符串，也可以是按轮次ID配置的字典。'''
+    if isinstance(scheduled_start, dict):
+        return scheduled_start.get(e_id, '')
+    return scheduled_start
+
+
+def wait_for_scheduled_start(start: str, connections: int):
+    '''按服务器时间等待到 `start`，并在开始前预热连接池。
+
+    先在开始前估计服务器时钟偏差，在开始前 `warmup_lead` 秒同时建立 `connections` 个连接，
+    最后按服务器时间精确地等待到开始时刻。
+
+    Args:
+        start (str): 开始时间（北京时间），格式为 `YYYY-MM-DD HH:MM:SS[.fff]`。
+        connections (int): 需要预热的连接数，通常与并发的选课表达式数量一致。
+    '''
+    start_ts = clock.parse_start_time(start)
+    # 时钟同步大约需要 samples 秒，留出足够的余量
+    clock.sleep_until(start_ts - warmup_lead - 30)
+    try:
+        offset, error = clock.estimate_offset(server_date)
+        print(f"[Info] Server clock offset: {offset * 1000:+.0f}ms (±{error * 1000:.0f}ms).")
+    except Exception as e:
+        offset = 0.0
+        print(f"[Warning] Could not synchronise with server clock, using local clock: {e}")
+
+    clock.sleep_until(start_ts - warmup_lead - offset)
+    ids.warm_up(f'{host}/eams/home.action', connections, headers=headers, allow_redirects=False)
+    print(f"[Info] Warmed up {connections} connections, waiting for {start}.")
+    clock.sleep_until(start_ts - offset)
+
+
+def input_courses_exps() -> list[str]:
+    '''在控制台中交互式地输入选课表达式，以空行结束。'''
+    exps_list = []
+    print('请输入您想选择的课程表达式，每个表达式占一行，以空行结束输入。')
+    while True:
+        exp_input = input('课程表达式: ')
+        if exp_input == '': # 空行表示输入结束
             break
-            
-    return final_result # 返回最后一次尝试的结果
+        exps_list.append(exp_input)
+    return exps_list
+
+
+def export_courses_list(data: list[dict], e_id: str, fmt: str | None = None) -> str:
+    '''导出课程列表到 `<选课轮次ID>.<格式>`，返回文件名。
+
+    Args:
+        data (list[dict]): `get_courses` 返回的课程列表。
+        e_id (str): 选课轮次的ID。
+        fmt (str | None, optional): 'tsv' 或 'xlsx'，默认使用 `sheet_format`，未配置时为 'xlsx'。
+    '''
+    fmt = fmt or sheet_format or 'xlsx'
+    file_name = f'{e_id}.{fmt}'
+    exporter.export(data, file_name, fmt)
+    return file_name
+
 
+def search_courses_exps(index: search.CourseIndex, refresh=None) -> list[str]:
+    '''在控制台中搜索课程并生成选课表达式，以空行结束。
 
-def thread_elect_courses_exps(exps: list[str], e_id: str):
+    - 输入关键词搜索课程，语法见 `search.CourseIndex.search`，例如 `高等数学 teacher:张 is:available`；
+    - 输入 `+1 3 5` 把上一次搜索结果中的第1、3、5门课程按顺序组成“或”表达式，前面的优先；
+    - 直接输入由课程ID组成的表达式（例如 `114&&514;810`）则原样加入；
+    - 输入 `refresh` 重新获取课程余量，输入 `exps` 查看已添加的表达式。
+
+    Args:
+        index (search.CourseIndex): 当前选课轮次的课程索引。
+        refresh (Callable[[], dict] | None, optional): 获取最新课程状态的函数，为 None 时不支持 `refresh`。
+
+    Returns:
+        list[str]: 添加的选课表达式。
+    '''
+    exps_list = []
+    results = []
+    print('搜索课程，例如 `高等数学 teacher:张 is:available`；`+1 3` 把搜索结果中的课程组成“或”表达式；')
+    print('也可以直接输入选课表达式。`refresh` 刷新余量，`exps` 查看已添加的表达式，空行结束输入。')
+    while True:
+        line = input('查询: ').strip()
+        if line == '': # 空行表示输入结束
+            break
+        if line == 'exps':
+            for exp_item in exps_list:
+                print(f'  {exp_item}')
+        elif line == 'refresh':
+            if refresh is None:
+                print('Course availability is not available.')
+                continue
+            try:
+                index.update_status(refresh())
+                print('Course availability refreshed.')
+            except Exception as e:
+                print(f"Could not refresh course availability: {e}")
+        elif line.startswith('+'):
+            try:
+                picked = [results[int(n) - 1] for n in line[1:].split()]
+            except (ValueError, IndexError):
+                print(f'Please choose numbers between 1 and {len(results)}.')
+                continue
+            if picked:
+                exps_list.append('||'.join(str(course.get('id')) for course in picked))
+                print(f'Added expression: {exps_list[-1]}')
+        elif all(c.isdigit() or c in '&|;() ' for c in line):
+            exps_list.append(line)
+            print(f'Added expression: {line}')
+        else:
+            results = index.search(line)
+            if not results:
+                print('No courses found.')
+            for n, course in enumerate(results, 1):
+                print(f'  [{n}]\t{index.format(course)}')
+    return exps_list
+
+
+def compile_courses_exps(exps_list: list[str], e_id: str, catalog: list[dict] | None = None) -> list[tuple[str, exps.Node]]:
+    '''编译全部选课表达式，并用课程列表检查其中的课程ID。
+
+    语法错误或包含未知课程ID的表达式会被打印出来并跳过。启用 `timetable_check` 时，
+    还会根据课程的上课时间调整或运算的分支，见 `timetable.Timetable.arrange`。
+
+    Args:
+        exps_list (list[str]): 选课表达式字符串列表。
+        e_id (str): 当前选课轮次的ID。
+        catalog (list[dict] | None, optional): `get_courses` 返回的课程列表，
+            为 None 时会尝试获取，获取失败则不检查课程ID。Defaults to None.
+
+    Returns:
+        list[tuple[str, exps.Node]]: 原始表达式及其编译结果。
+    '''
+    if catalog is None:
+        try:
+            catalog = get_courses(e_id)
+        except Exception as e:
+            print(f"[Warning] Could not fetch course list for election {e_id}, course ids will not be validated: {e}")
+    catalog_ids = None if catalog is None else [course.get('id') for course in catalog]
+
+    plans = []
+    for exp_item in exps_list:
+        try:
+            plans.append((exp_item, exps.compile_exp(exp_item, catalog_ids)))
+        except exps.ExpressionError as e:
+            print(f"[Error] Skipping invalid course expression {exp_item!r}: {e}")
+
+    if timetable_check and catalog is not None:
+        # 按上课时间删去或后移一定会冲突的分支，选课过程中再逐次检查新选上的课程
+        elected_ids = list(elected_course_ids) + (checkpoint.elected(username, e_id) if checkpoint is not None else [])
+        timetable = timetables[e_id] = Timetable(catalog, elected_ids)
+        arranged = timetable.arrange(plans)
+        for (exp_item, plan), (_, new_plan) in zip(plans, arranged):
+            if new_plan != plan:
+                print(f"[Info] Rearranged {exp_item!r} to avoid timetable conflicts: {exps.format_exp(new_plan)}")
+        plans = arranged
+    return plans
+
+
+def thread_elect_courses_exps(exps_list: list[str], e_id: str, catalog: list[dict] | None = None) -> list[tuple[str, ElectResult | None]]:
     '''为每个选课表达式创建一个线程来执行选课操作。
 
-    如果 `exps` 列表为空，则会进入交互模式，提示用户输入选课表达式。
+    如果 `exps_list` 列表为空，则会进入交互模式，提示用户输入选课表达式。
 
     Args:
-        exps (list[str]): 包含选课表达式字符串的列表。
+        exps_list (list[str]): 包含选课表达式字符串的列表。
         e_id (str): 当前选课轮次的ID。
+        catalog (list[dict] | None, optional): 用于检查课程ID的课程列表，见 `compile_courses_exps`。
+
+    Returns:
+        list[tuple[str, ElectResult | None]]: 每个有效表达式及其最终结果，线程异常退出时结果为 None。
     '''
+    # 如果没有预设的选课表达式，则进入交互模式
+    if len(exps_list) == 0:
+        exps_list.extend(input_courses_exps())
+
+    plans = compile_courses_exps(exps_list, e_id, catalog)
+    # 每个线程同一时间只占用一个 Session，池大小默认与表达式数量一致
+    ids.set_pool_size(session_pool_size or max(ids.pool_size, len(plans)))
+    # 访问选课页面、获取课程状态和启动后台任务都放在定时开始之后，等待期间只保持会话
+    start = scheduled_start_for(e_id)
+    if start:
+        wait_for_scheduled_start(start, len(plans))
+
     head_election(e_id) # 先访问选课页面，可能为了会话保持
 
-    courses_status_data_for_retry = None
-    if ENABLE_RETRY_ON_PERCENTAGE_LIMIT:
+    # 启用监视器时由监视器提供实时的课程状态，否则只在开始时获取一次
+    watcher = start_capacity_watcher(e_id)
+    # 出错时也要停止后台的监视器、批处理器和调度器，否则它们会继续发送请求
+    try:
+        courses_status_data_for_retry = watcher.data if watcher else _fetch_retry_status(e_id)
+        start_batcher(e_id, courses_status_data_for_retry)
+        start_scheduler(e_id, courses_status_data_for_retry)
+
+        results = [None] * len(plans)
+
+        def run(i: int, exp_item: str, plan: exps.Node):
+            results[i] = run_courses_plan(plan, e_id, exp_item, courses_status_data_for_retry)
+
+        threads = []
+        for i, (exp_item, plan) in enumerate(plans):
+            # 创建并启动线程，将原始表达式(exp_item)用于日志追踪，并传入课程状态数据
+            t = threading.Thread(target=run, args=(i, exp_item, plan))
+            threads.append(t)
+            t.start()
+            if limiter is None:
+                sleep(threads_interval) # 控制线程启动的间隔，避免瞬间过多请求
+
+        # 等待所有选课线程执行完毕
+        for t in threads:
+            t.join()
+    finally:
+        stop_scheduler(e_id)
+        stop_batcher(e_id)
+        stop_capacity_watcher(e_id)
+        log.flush() # 让选课线程的日志先于之后的输出写出
+    return [(exp_item, result) for (exp_item, _), result in zip(plans, results)]
+
+
+async def async_elect_courses_exps(exps_list: list[str], e_id: str, catalog: list[dict] | None = None) -> list[tuple[str, ElectResult | None]]:
+    '''在同一个事件循环中并发执行所有选课表达式。
+
+    与 `thread_elect_courses_exps` 行为一致，但每个表达式是一个协程而不是一个线程，
+    同时在途的HTTP请求数由 `async_max_inflight` 限制。
+
+    Args:
+        exps_list (list[str]): 包含选课表达式字符串的列表，为空时进入交互模式。
+        e_id (str): 当前选课轮次的ID。
+        catalog (list[dict] | None, optional): 用于检查课程ID的课程列表，见 `compile_courses_exps`。
+
+    Returns:
+        list[tuple[str, ElectResult | None]]: 每个有效表达式及其最终结果，表达式出错时结果为 None。
+    '''
+    import asyncio
+
+    ids.set_max_inflight(async_max_inflight)
+    ids.set_pool_size(session_pool_size or async_max_inflight)
+    if len(exps_list) == 0:
+        exps_list.extend(input_courses_exps())
+
+    plans = await ids.arun(compile_courses_exps, exps_list, e_id, catalog)
+    start = scheduled_start_for(e_id)
+    if start:
+        await ids.arun(wait_for_scheduled_start, start, min(ids.pool_size, len(plans)))
+
+    await ids.arun(head_election, e_id)
+    watcher = await ids.arun(start_capacity_watcher, e_id)
+    try:
+        courses_status_data_for_retry = watcher.data if watcher else await ids.arun(_fetch_retry_status, e_id)
+        start_batcher(e_id, courses_status_data_for_retry)
+        await ids.arun(start_scheduler, e_id, courses_status_data_for_retry)
+
+        tasks = []
+        for exp_item, plan in plans:
+            tasks.append(asyncio.create_task(
+                async_run_courses_plan(plan, e_id, exp_item, courses_status_data_for_retry)))
+            if limiter is None:
+                await asyncio.sleep(threads_interval) # 与线程模式相同的启动间隔
+        # 与线程引擎一致，某个表达式出错时结果为 None，不影响其他表达式
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for (exp_item, _), result in zip(plans, results):
+            if isinstance(result, BaseException):
+                log.error('plan_crashed', '[Error] {exp} failed: {error}', e_id=e_id, exp=exp_item,
+                          error=f'{type(result).__name__}: {result}')
+        return [(exp_item, None if isinstance(result, BaseException) else result)
+                for (exp_item, _), result in zip(plans, results)]
+    finally:
+        await ids.arun(stop_scheduler, e_id)
+        await ids.arun(stop_batcher, e_id)
+        stop_capacity_watcher(e_id)
+        await ids.arun(log.flush)
+
+
+def elect_courses_exps(exps_list: list[str], e_id: str, catalog: list[dict] | None = None) -> list[tuple[str, ElectResult | None]]:
+    '''根据 `async_engine` 配置选择线程或异步引擎执行选课表达式，返回每个表达式及其最终结果。'''
+    if async_engine:
+        import asyncio
+
+        return asyncio.run(async_elect_courses_exps(exps_list, e_id, catalog))
+    return thread_elect_courses_exps(exps_list, e_id, catalog)
+
+
+def run_elections(profiles: dict[str, list[str]]) -> dict[str, list[tuple[str, ElectResult | None]]]:
+    '''同时执行多个选课轮次的表达式，每个轮次按各自的定时开始时间开始。
+
+    线程引擎下每个轮次在独立的线程中运行，异步引擎下所有轮次在同一个事件循环中并发运行，
+    每个轮次各自访问选课页面并获取课程状态。某个轮次出错不会影响其他轮次。
+
+    Args:
+        profiles (dict[str, list[str]]): 键为选课轮次ID，值为该轮次的选课表达式列表。
+
+    Returns:
+        dict[str, list[tuple[str, ElectResult | None]]]: 键为选课轮次ID，值同 `elect_courses_exps` 的返回值，
+            出错的轮次为空列表。
+    '''
+    # 所有轮次的表达式同时运行，Session 池按表达式总数分配
+    ids.set_pool_size(session_pool_size or max(ids.pool_size, sum(len(v) for v in profiles.values())))
+    if async_engine:
+        import asyncio
+
+        return asyncio.run(async_run_elections(profiles))
+
+    results = {}
+
+    def run(e_id: str, exps_list: list[str]):
+        print(f"--- Starting election for profile ID: {e_id} ---")
         try:
-            print(f"[Info] Fetching course status for election {e_id} for percentage-based retry logic...")
-            semester_params = get_semester_info(e_id)
-            courses_status_data_for_retry = get_courses_status(semester_params)
-            print(f"[Info] Successfully fetched course status for election {e_id}.")
+            results[e_id] = thread_elect_courses_exps(list(exps_list), e_id)
         except Exception as e:
-            print(f"[Warning] Could not fetch course status for election {e_id} (used for percentage-based retry): {e}")
-            print("[Warning] Percentage-based retry for full courses will effectively be disabled for this round.")
+            print(f"[Error] Election for profile ID {e_id} failed: {e}")
+            results[e_id] = []
+        print(f"--- Finished election for profile ID: {e_id} ---")
 
-    # 如果没有预设的选课表达式，则进入交互模式
-    if len(exps) == 0:
-        print('请输入您想选择的课程表达式，每个表达式占一行，以空行结束输入。')
-        while True:
-            exp_input = input('课程表达式: ')
-            if exp_input == '': # 空行表示输入结束
-                break
-            exps.append(exp_input)
-
-    threads = []
-    for exp_item in exps:
-        # 清理表达式：移除空格，统一逻辑运算符
-        cleaned_exp = exp_item.strip().replace(' ', '')
-        cleaned_exp = cleaned_exp.replace('&&', '&').replace('||', '|')
-
-        # 创建并启动线程，将原始表达式(exp_item)用于日志追踪，并传入课程状态数据
-        t = threading.Thread(target=parse_courses_exp, args=(cleaned_exp, e_id, exp_item, courses_status_data_for_retry))
-        threads.append(t)
+    threads = [threading.Thread(target=run, args=item) for item in profiles.items()]
+    for t in threads:
         t.start()
-        sleep(threads_interval) # 控制线程启动的间隔，避免瞬间过多请求
-
-    # 等待所有选课线程执行完毕
     for t in threads:
         t.join()
+    return {e_id: results[e_id] for e_id in profiles}
 
 
-if __name__ == '__main__':
-    ids = IdsAuth() # 初始化认证对象
+async def async_run_elections(profiles: dict[str, list[str]]) -> dict[str, list[tuple[str, ElectResult]]]:
+    '''`run_elections` 的异步版本，所有轮次在当前事件循环中并发运行。'''
+    import asyncio
 
-    # 尝试从 'cookies.json' 文件加载已保存的cookies
-    if os.path.exists('cookies.json'):
+    async def run(e_id: str, exps_list: list[str]) -> list[tuple[str, ElectResult]]:
+        print(f"--- Starting election for profile ID: {e_id} ---")
         try:
-            with open('cookies.json', 'r') as f:
+            return await async_elect_courses_exps(list(exps_list), e_id)
+        except Exception as e:
+            print(f"[Error] Election for profile ID {e_id} failed: {e}")
+            return []
+        finally:
+            print(f"--- Finished election for profile ID: {e_id} ---")
+
+    results = await asyncio.gather(*(run(e_id, exps_list) for e_id, exps_list in profiles.items()))
+    return dict(zip(profiles, results))
+
+
+def run_default_courses_exps() -> dict[str, list[tuple[str, ElectResult | None]]]:
+    '''同时执行 `default_courses_exps` 中所有选课轮次的表达式，返回值同 `run_elections`。'''
+    return run_elections(default_courses_exps)
+
+
+def start_capture(path: str):
+    '''把 `ids` 之后发送的所有请求和响应录制到归档 `path`，进程退出时写入剩余的记录。'''
+    import atexit
+    import capture
+
+    global recorder
+    if recorder is not None:
+        recorder.close()
+    recorder = capture.record(ids, path)
+    atexit.register(recorder.close)
+    print(f'Recording HTTP traffic to {path}.')
+
+
+def login_ids(cookies_path: str = 'cookies.json') -> IdsAuth:
+    '''创建模块使用的认证对象 `ids`：优先加载保存的cookies，无效时使用用户名和密码登录。
+
+    登录成功后cookies会保存到 `cookies_path`，之后重新登录时也会自动保存。
+    调用方应检查返回对象的 `ok` 属性判断是否登录成功。
+    `session_check_interval` 大于0时，登录成功后在后台定期检查会话并自动重新登录。
+    '''
+    global ids
+    if ids is not None:
+        ids.stop_keep_alive() # 停止上一个认证对象的会话保活
+    ids = IdsAuth(cookies_path=cookies_path) # 初始化认证对象，重新登录后自动保存cookies
+    flights.clear() # 已选上的课程属于上一个账号
+
+    # 尝试从cookies文件加载已保存的cookies
+    if os.path.exists(cookies_path):
+        try:
+            with open(cookies_path, 'r') as f:
                 cookies = json.load(f)
-            ids = IdsAuth(cookies) # 使用加载的cookies初始化认证对象
+            ids = IdsAuth(cookies, cookies_path=cookies_path) # 使用加载的cookies初始化认证对象
             print('Cookies loaded successfully.')
         except Exception as e:
             print(f"Failed to load cookies: {e}. Will try to login with username/password.")
-            ids = IdsAuth() # 重置为未使用cookie的状态
+            ids = IdsAuth(cookies_path=cookies_path) # 重置为未使用cookie的状态
+
+    if capture_path:
+        start_capture(capture_path)
 
     # 如果没有有效的cookies或加载失败，则尝试使用用户名和密码登录
     if not ids.ok:
         print('Logging in by username and password...')
         ids.login(username, password, service)
-    
-    # 检查登录状态
+
     if ids.ok:
-        # 登录成功，保存最新的cookies到 'cookies.json'
+        # 登录成功，保存最新的cookies
         try:
-            with open('cookies.json', 'w') as f:
-                json.dump(ids.cookies, f)
+            ids.save_cookies(cookies_path)
             print('Login success. Cookies saved.')
         except Exception as e:
             print(f"Login success, but failed to save cookies: {e}")
-    else:
+        if session_check_interval > 0:
+            # 后台定期检查会话，在选课请求发现会话过期之前重新登录
+            ids.keep_alive(username, password, service, session_check_interval, session_max_age)
+    return ids
+
+
+if __name__ == '__main__':
+    start_metrics()
+    login_ids('cookies.json')
+    if not ids.ok:
         print('Login failed.')
         exit(1) # 登录失败，退出程序
 
     # 如果在 envconfig.py 中配置了默认选课表达式，则执行它们
     if len(default_courses_exps) > 0:
         print('Processing default course expressions from envconfig.py...')
-        for election_id_key, courses_exps_list in default_courses_exps.items():
-            print(f"--- Starting election for profile ID: {election_id_key} ---")
-            thread_elect_courses_exps(courses_exps_list, election_id_key)
-            print(f"--- Finished election for profile ID: {election_id_key} ---")
+        run_default_courses_exps()
         print('All default course expressions processed.')
         exit(0) # 处理完默认表达式后退出
 
@@ -469,7 +1223,7 @@ if __name__ == '__main__':
 
     # 如果配置了跳过课程列表显示，则直接进入选课表达式输入
     if skip_course_list:
-        thread_elect_courses_exps([], selected_election_id) # 传入空列表以触发交互式表达式输入
+        elect_courses_exps([], selected_election_id) # 传入空列表以触发交互式表达式输入
         exit(0)
 
     # 获取并显示课程列表
@@ -477,6 +1231,8 @@ if __name__ == '__main__':
     data = get_courses(selected_election_id)
 
     # 如果配置了检查课程余量
+    courses_status = None
+    semester_params = None
     if check_course_availability:
         print('Checking course availability...')
         try:
@@ -488,57 +1244,25 @@ if __name__ == '__main__':
                     course['available'] = course_status.get('sc', 0) < course_status.get('lc', 0)
                 else:
                     course['available'] = 'Unknown' # 如果没有状态信息，标记为未知
-            # 按是否有余量和课程ID排序
-            data.sort(key=lambda x: (x['available'] is not True, x.get('id')))
         except Exception as e:
             print(f"Could not check course availability: {e}")
-            # 按课程ID排序
-            data.sort(key=lambda x: x.get('id'))
-    else:
-        # 不检查余量，直接按课程ID排序
-        data.sort(key=lambda x: x.get('id'))
 
     # 如果配置了导出课程列表到文件
-    if sheet_format in ['tsv', 'xlsx']:
+    if sheet_format in exporter.formats:
         try:
-            df = pd.DataFrame(data)
-            if sheet_format == 'tsv':
-                file_name = f'{selected_election_id}.tsv'
-                df.to_csv(file_name, sep='\t', index=False)
-                print(f'Course list exported to {file_name}')
-            elif sheet_format == 'xlsx':
-                file_name = f'{selected_election_id}.xlsx'
-                df.to_excel(file_name, index=False)
-                print(f'Course list exported to {file_name}')
+            file_name = export_courses_list(data, selected_election_id)
+            print(f'Course list exported to {file_name}')
         except Exception as e:
             print(f"Failed to export course list: {e}")
-    
+
     print(f'Please checkout full information on website' +
-          (' or in the exported file.' if sheet_format in ['tsv', 'xlsx'] else '.'))
+          (' or in the exported file.' if sheet_format in exporter.formats else '.'))
 
-    # 打印课程列表到控制台
-    print('Courses: ')
-    column_keys = ['id', 'no', 'name', 'teachers']
-    if check_course_availability:
-        column_keys.append('available')
-
-    # 打印表头
-    header_string = '  ' + '\t'.join([str(key_name).ljust(10) for key_name in column_keys])
-    print(header_string)
-    # 打印每行课程信息
-    for course in data:
-        row_values = []
-        for key in column_keys:
-            value = course.get(key, 'N/A') # 如果键不存在，使用 'N/A'
-            # 为了对齐，将老师信息截断或填充
-            if key == 'teachers' and isinstance(value, str):
-                 value = value[:18].ljust(20) # 假设老师名字段最长显示18，总共占20位
-            elif key == 'name' and isinstance(value, str):
-                value = value[:28].ljust(30) # 假设课程名最长显示28，总共占30位
-            else:
-                value = str(value).ljust(10) # 其他字段长度10
-            row_values.append(value)
-        print('  ' + '\t'.join(row_values))
+    # 为课程列表建立索引，通过搜索查找课程并生成选课表达式
+    index = search.CourseIndex(data, courses_status)
+    print(f'{len(data)} courses loaded.')
+    refresh = (lambda: get_courses_status(semester_params)) if semester_params is not None else None
+    exps_list = search_courses_exps(index, refresh)
 
     # 进入交互式选课表达式输入环节
-    thread_elect_courses_exps([], selected_election_id) # 传入空列表以触发交互式表达式输入
+    elect_courses_exps(exps_list, selected_election_id, data) # 没有添加表达式时进入交互式表达式输入
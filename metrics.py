@@ -0,0 +1,228 @@
+'''请求级别的指标：按接口统计的延迟直方图、状态码和选课结果计数、在途请求数。
+
+指标保存在进程内，每次更新只是一次加锁的字典操作，选课高峰期间也可以一直开启。
+可以用 `serve` 以 Prometheus 文本格式暴露，或用 `start_dump` 定期写入 JSON 文件。
+'''
+import atexit
+import bisect
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+# 延迟直方图的桶上界（秒）
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 所有已定义的指标，按定义顺序输出
+registry: list = []
+
+
+class Counter:
+    '''按标签分组的计数器。'''
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self) -> list[tuple[tuple, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(Counter):
+    '''可增可减的计量值，例如在途请求数。'''
+    type = 'gauge'
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    '''按标签分组的直方图，桶边界固定，观测时只需一次二分查找。'''
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = latency_buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # 标签 -> [各桶计数（最后一个为 +Inf）, 观测值之和]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def samples(self) -> list[tuple[tuple, list[int], float]]:
+        with self._lock:
+            return [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+
+    def quantile(self, q: float, counts: list[int]) -> float:
+        '''由桶计数估计分位数，在桶内线性插值；落在 +Inf 桶时返回最大的有限边界。'''
+        n = sum(counts)
+        if n == 0:
+            return float('nan')
+        rank = q * n
+        seen = 0
+        for i, c in enumerate(counts):
+            if seen + c >= rank and c > 0:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+
+request_latency = Histogram('eams_request_duration_seconds', 'HTTP request latency by endpoint.',
+                            ('method', 'endpoint'))
+request_status = Counter('eams_requests_total', 'HTTP requests by endpoint and status code.',
+                         ('method', 'endpoint', 'status'))
+requests_in_flight = Gauge('eams_requests_in_flight', 'HTTP requests currently in flight.',
+                           ('endpoint',))
+elect_outcomes = Counter('eams_elect_outcomes_total', 'Course election attempts by outcome.',
+                         ('outcome',))
+coalesced_attempts = Counter('eams_coalesced_attempts_total',
+                             'Course attempts answered by an in-flight attempt or a won course.', ('source',))
+retry_wait = Histogram('eams_retry_wait_seconds', 'Time retries waited for their turn in the retry scheduler.')
+
+
+def endpoint_name(url: str) -> str:
+    '''取URL路径的最后一段作为接口名，例如 `stdElectCourse!batchOperator.action`。'''
+    return urlsplit(url).path.rsplit('/', 1)[-1] or '/'
+
+
+def observe_request(method: str, endpoint: str, status: int | str, seconds: float):
+    request_latency.observe(seconds, method, endpoint)
+    request_status.inc(method, endpoint, str(status))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = '') -> str:
+    items = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        items.append(extra)
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+def render() -> str:
+    '''以 Prometheus 文本格式输出所有指标。'''
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        if isinstance(metric, Histogram):
+            for labels, counts, total in metric.samples():
+                cumulative = 0
+                for bound, c in zip(metric.buckets + (float('inf'),), counts):
+                    cumulative += c
+                    le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                    lines.append(f'{metric.name}_bucket{_labels(metric.labels, labels, le)} {cumulative}')
+                lines.append(f'{metric.name}_sum{_labels(metric.labels, labels)} {total}')
+                lines.append(f'{metric.name}_count{_labels(metric.labels, labels)} {cumulative}')
+        else:
+            for labels, value in metric.samples():
+                lines.append(f'{metric.name}{_labels(metric.labels, labels)} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot() -> dict:
+    '''以字典形式返回所有指标，直方图附带估计的 p50/p90/p99（秒）。'''
+    result = {}
+    for metric in registry:
+        series = []
+        if isinstance(metric, Histogram):
+            for labels, counts, total in metric.samples():
+                series.append({
+                    'labels': dict(zip(metric.labels, labels)),
+                    'count': sum(counts),
+                    'sum': total,
+                    'p50': metric.quantile(0.5, counts),
+                    'p90': metric.quantile(0.9, counts),
+                    'p99': metric.quantile(0.99, counts),
+                })
+        else:
+            for labels, value in metric.samples():
+                series.append({'labels': dict(zip(metric.labels, labels)), 'value': value})
+        result[metric.name] = series
+    return result
+
+
+def dump(path: str):
+    '''原子地把 `snapshot` 写入 JSON 文件。'''
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def start_dump(path: str, interval: float) -> threading.Event:
+    '''每隔 `interval` 秒把指标写入 `path`，进程退出时再写一次。
+
+    Returns:
+        threading.Event: 设置后停止定期写入。
+    '''
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            try:
+                dump(path)
+            except OSError as e:
+                print(f'[Warning] Failed to dump metrics: {e}')
+
+    threading.Thread(target=run, daemon=True).start()
+    atexit.register(dump, path)
+    return stopped
+
+
+def serve(port: int, host: str = '127.0.0.1'):
+    '''在后台线程中提供 `/metrics`（Prometheus 文本格式）和 `/metrics.json`，返回 `ThreadingHTTPServer`。'''
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path == '/metrics':
+                body, content_type = render().encode(), 'text/plain; version=0.0.4; charset=utf-8'
+            elif path == '/metrics.json':
+                body, content_type = json.dumps(snapshot(), ensure_ascii=False).encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
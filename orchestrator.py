@@ -0,0 +1,200 @@
+'''多账号选课调度器。
+
+每个账号一个配置文件，格式同 `envconfig.py`，未填写的配置项使用 `envconfig.example.py` 中的默认值。
+所有账号在进程池中并行运行，每个进程只运行一个账号，拥有独立的 `IdsAuth` 会话，
+cookies 保存在 `--cookies-dir` 下以学号命名的文件中，输出写入 `--log-dir` 下的日志文件。
+所有账号共享一个由管理进程托管的自适应限速器，合计的请求速率从 `--rate` 开始按服务器反馈调整。
+
+用法：
+
+    python orchestrator.py accounts/*.py --rate 20 --processes 8 --report report.json
+'''
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+import time
+import traceback
+import types
+from multiprocessing.managers import BaseManager, BaseProxy
+from ratelimit import AdaptiveRateLimiter
+
+root = os.path.dirname(os.path.abspath(__file__))
+
+
+class LimiterManager(BaseManager):
+    '''在独立进程中托管所有账号共享的限速器。'''
+
+
+class LimiterProxy(BaseProxy):
+    '''管理进程中限速器的代理，`rate` 属性通过 `__getattribute__` 读取。'''
+    _exposed_ = ('reserve', 'on_success', 'on_throttle', 'on_overload', '__getattribute__')
+
+    @property
+    def rate(self) -> float:
+        return self._callmethod('__getattribute__', ('rate',))
+
+    def reserve(self) -> float:
+        return self._callmethod('reserve')
+
+    def on_success(self):
+        self._callmethod('on_success')
+
+    def on_throttle(self):
+        self._callmethod('on_throttle')
+
+    def on_overload(self):
+        self._callmethod('on_overload')
+
+
+LimiterManager.register('AdaptiveRateLimiter', AdaptiveRateLimiter, proxytype=LimiterProxy)
+
+
+class SharedRateLimiter:
+    '''账号进程中使用的共享限速器，接口同 `AdaptiveRateLimiter`。
+
+    令牌在管理进程中预留，需要等待的时间在本进程中睡眠，不会占用管理进程的线程。
+    '''
+
+    def __init__(self, proxy):
+        self._proxy = proxy
+
+    @property
+    def rate(self) -> float:
+        return self._proxy.rate
+
+    def reserve(self) -> float:
+        return self._proxy.reserve()
+
+    def acquire(self):
+        wait = self._proxy.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        wait = await asyncio.to_thread(self._proxy.reserve)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        self._proxy.on_success()
+
+    def on_throttle(self):
+        self._proxy.on_throttle()
+
+    def on_overload(self):
+        self._proxy.on_overload()
+
+
+def load_config(path: str) -> types.ModuleType:
+    '''读取账号配置文件并注册为 `envconfig` 模块，缺少的配置项使用 `envconfig.example.py` 中的默认值。'''
+    config = types.ModuleType('envconfig')
+    for config_path in (os.path.join(root, 'envconfig.example.py'), path):
+        for name, value in runpy.run_path(config_path).items():
+            if not name.startswith('__'):
+                setattr(config, name, value)
+    sys.modules['envconfig'] = config
+    return config
+
+
+def run_account(config_path: str, limiter, cookies_dir: str, log_dir: str) -> dict:
+    '''在进程池的工作进程中运行一个账号的全部默认选课表达式。
+
+    Args:
+        config_path (str): 账号配置文件路径。
+        limiter: 共享限速器的代理对象，为 None 时使用账号配置中的限速设置。
+        cookies_dir (str): 保存各账号 cookies 的目录。
+        log_dir (str): 保存各账号输出的目录。
+
+    Returns:
+        dict: 包含 config、username、error 和 results，
+            results 的格式同 `main.run_default_courses_exps` 的返回值。
+    '''
+    report = {'config': config_path, 'username': None, 'error': None, 'results': {}}
+    try:
+        config = load_config(config_path)
+        report['username'] = config.username
+        os.makedirs(cookies_dir, exist_ok=True)
+        os.makedirs(log_dir, exist_ok=True)
+        log = open(os.path.join(log_dir, f'{config.username}.log'), 'a', buffering=1, encoding='utf-8')
+        sys.stdout = sys.stderr = log
+
+        import main
+        if limiter is not None:
+            main.limiter = SharedRateLimiter(limiter)
+        if len(config.default_courses_exps) == 0:
+            raise Exception('No default_courses_exps configured.')
+        if not main.login_ids(os.path.join(cookies_dir, f'{config.username}.json')).ok:
+            raise Exception('Login failed.')
+        report['results'] = main.run_default_courses_exps()
+    except Exception as e:
+        traceback.print_exc()
+        report['error'] = str(e) or type(e).__name__
+    if 'main' in sys.modules:
+        sys.modules['main'].log.flush() # 工作进程退出时不会执行 atexit，先写出剩余的日志
+    return report
+
+
+def print_report(reports: list[dict]):
+    '''按账号汇总打印每个表达式的最终结果。'''
+    for report in reports:
+        name = report['username'] or report['config']
+        if report['error']:
+            print(f'{name}: ERROR {report["error"]}')
+            continue
+        outcomes = [result for results in report['results'].values() for _, result in results]
+        won = sum(1 for result in outcomes if result is not None and result[2])
+        print(f'{name}: {won}/{len(outcomes)} expressions succeeded')
+        for e_id, results in report['results'].items():
+            for exp_item, result in results:
+                if result is None:
+                    print(f'  [{e_id}] {exp_item}: crashed')
+                else:
+                    state = 'succeeded' if result[2] else 'failed'
+                    print(f'  [{e_id}] {exp_item}: {state} ({result[0]}: {result[1]})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run course elections for many accounts in a process pool.')
+    parser.add_argument('configs', nargs='+', help='per-account envconfig files')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='number of worker processes (default: one per account)')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='initial total request rate shared by all accounts (0 to use per-account settings)')
+    parser.add_argument('--max-rate', type=float, default=0,
+                        help='upper bound of the shared request rate (default: 4x --rate)')
+    parser.add_argument('--cookies-dir', default='cookies')
+    parser.add_argument('--log-dir', default='logs')
+    parser.add_argument('--report', help='write the aggregated results to this JSON file')
+    args = parser.parse_args()
+
+    # 每个账号在新启动的进程中导入 main，使其读取该账号的 envconfig
+    ctx = multiprocessing.get_context('spawn')
+    manager = None
+    limiter = None
+    if args.rate > 0:
+        manager = LimiterManager(ctx=ctx)
+        manager.start()
+        limiter = manager.AdaptiveRateLimiter(args.rate, args.max_rate or None)
+
+    processes = args.processes or len(args.configs)
+    print(f'Running {len(args.configs)} accounts in {processes} processes, logs in {args.log_dir}/')
+    try:
+        with ctx.Pool(processes, maxtasksperchild=1) as pool:
+            reports = pool.starmap(run_account, [(path, limiter, args.cookies_dir, args.log_dir)
+                                                 for path in args.configs])
+    finally:
+        if manager is not None:
+            manager.shutdown()
+
+    print_report(reports)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+'''所有选课循环共享的自适应限速器。
+
+令牌桶决定请求的发送节奏，速率按 AIMD（加性增、乘性减）根据服务器的反馈调整：
+请求被正常处理时缓慢提高速率，遇到“请不要过快点击”或服务器错误时成倍降低速率。
+连续出现服务器过载时熔断器打开，在一段带随机抖动的冷却时间内暂停发送请求。
+'''
+import random
+import threading
+import time
+
+
+class AdaptiveRateLimiter:
+    '''带 AIMD 调整和熔断器的令牌桶。
+
+    Args:
+        rate (float): 初始速率（请求/秒）。
+        max_rate (float | None, optional): 速率上限，默认为初始速率的4倍。
+        min_rate (float, optional): 速率下限。Defaults to 0.2.
+        burst (float | None, optional): 令牌桶容量，默认为1秒的请求量。
+        increase (float, optional): 请求持续被正常处理时，每秒增加的速率。Defaults to 0.5.
+        decrease (float, optional): 被限流或服务器出错时速率乘以的系数。Defaults to 0.5.
+        breaker_threshold (int, optional): 连续多少次服务器过载后打开熔断器。Defaults to 5.
+        breaker_cooldown (float, optional): 熔断器第一次打开的冷却时间（秒），
+            半开状态下再次过载时加倍，最多 `breaker_max_cooldown`。Defaults to 1.0.
+    '''
+
+    def __init__(self, rate: float, max_rate: float | None = None, min_rate: float = 0.2,
+                 burst: float | None = None, increase: float = 0.5, decrease: float = 0.5,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 1.0,
+                 breaker_max_cooldown: float = 30.0):
+        self.rate = rate
+        self.max_rate = max_rate or rate * 4
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst or max(1.0, rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.breaker_max_cooldown = breaker_max_cooldown
+
+        self.tokens = self.burst
+        self._last = time.monotonic()  # 令牌最后一次补充的时间，熔断期间位于未来
+        self._last_decrease = 0.0
+        self._overloads = 0
+        self._cooldown = breaker_cooldown
+        self._half_open = False
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        '''预留一个令牌，返回需要等待的秒数。令牌不足时记为欠款，按预留顺序排队。'''
+        now = time.monotonic()
+        with self._lock:
+            if now > self._last:
+                self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+                self._last = now
+            self.tokens -= 1
+            return max(0.0, self._last - now) + max(0.0, -self.tokens) / self.rate
+
+    def acquire(self):
+        '''阻塞直到可以发送下一个请求。'''
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        '''`acquire` 的异步版本。'''
+        import asyncio
+
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @property
+    def breaker_open(self) -> bool:
+        return self._last > time.monotonic()
+
+    def on_success(self):
+        '''请求被服务器正常处理（包括课程已满、冲突等业务结果）。'''
+        with self._lock:
+            self._overloads = 0
+            if self._half_open:
+                self._half_open = False
+                self._cooldown = self.breaker_cooldown
+            # 每个请求增加 increase / rate，即持续正常时每秒约增加 increase
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self):
+        '''服务器提示请求过快。'''
+        with self._lock:
+            self._decrease(time.monotonic())
+
+    def on_overload(self):
+        '''服务器返回5xx或内部错误，连续出现时打开熔断器。'''
+        now = time.monotonic()
+        with self._lock:
+            self._decrease(now)
+            self._overloads += 1
+            if self._half_open or self._overloads >= self.breaker_threshold:
+                self._open_breaker(now)
+
+    def _decrease(self, now: float):
+        # 同一批在途请求往往同时收到限流响应，一个间隔内只降速一次
+        if now - self._last_decrease < max(1.0 / self.rate, 0.5):
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+
+    def _open_breaker(self, now: float):
+        if self._half_open:
+            self._cooldown = min(self.breaker_max_cooldown, self._cooldown * 2)
+        # 随机抖动避免多个进程在同一时刻恢复发送
+        reopen_at = now + self._cooldown * random.uniform(1.0, 1.5)
+        print(f'[Warning] Server overloaded, pausing requests for {reopen_at - now:.1f}s.')
+        self.tokens = min(self.tokens, 0.0)
+        self._last = max(self._last, reopen_at)
+        self._overloads = 0
+        self._half_open = True
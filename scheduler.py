@@ -0,0 +1,165 @@
+'''按课程的抢课希望分配重试机会的调度器。
+
+每门等待重试的课程不再各自按固定的 `interval` 重试，而是在调度器中排队，由一个后台线程
+按总的请求预算依次放行。每次放行等待者中“权重 × 已等待时间”最大的一个：
+
+- 权重来自课程的实时已选人数和课容量：有空位的课程权重最高，已满的课程按
+  (课容量/已选人数)² 降低，已选人数是课容量3倍的课程只有满员课程的约1/9；
+- 课程在“或”运算中越靠后（前面的分支都失败后才会选它），权重越低；
+- 最近的尝试多次返回课程已满的课程，权重逐渐降低；
+- 等待时间越长越优先，权重再低的课程也不会一直得不到重试。
+
+总的请求预算有两种：配置了限速器时，每次放行先从限速器预留一个令牌，令牌随放行交给
+等待者，等待者发送请求时不再重复获取；否则每个等待者回到队列 `interval` 秒后产生一次
+重试机会，即原来的固定间隔重试发送请求的时刻，由当时排在最前的等待者使用。
+两种情况下请求的数量都与原来相同，只是按权重重新分配。
+'''
+import heapq
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import metrics
+from classifier import Outcome
+
+
+def scarcity_weight(status: dict | None, seat_weight: float = 4.0) -> float:
+    '''由课程状态 `{'sc': 已选人数, 'lc': 课容量}` 估计出现空位的可能性。
+
+    没有状态或课容量无效时返回 1，即与刚好满员的课程相同。
+    '''
+    if not status:
+        return 1.0
+    sc = status.get('sc', 0)
+    lc = status.get('lc', 0)
+    if lc <= 0:
+        return 1.0
+    if sc < lc:
+        return seat_weight
+    return (lc / sc) ** 2
+
+
+class _Waiter:
+    __slots__ = ('course_id', 'position', 'since', 'future')
+
+    def __init__(self, course_id: str, position: int):
+        self.course_id = course_id
+        self.position = position
+        self.since = time.monotonic()
+        self.future = Future()
+
+
+class RetryScheduler:
+    '''一个选课轮次的重试调度器。
+
+    Args:
+        status (Callable[[], dict]): 返回最新课程状态的函数，格式同 `main.get_courses_status`。
+        interval (float): 没有 `reserve` 时，等待者回到队列后经过多少秒产生一次重试机会。
+        reserve (Callable[[], float] | None, optional): 预留一个限速令牌并返回需要等待的秒数，
+            通常为 `AdaptiveRateLimiter.reserve`。提供时按限速器的速率放行。Defaults to None.
+        position_decay (float, optional): “或”运算中每靠后一个分支权重乘以的系数。Defaults to 0.7.
+        full_decay (float, optional): 一直返回课程已满的课程，权重最多降低的比例。Defaults to 0.75.
+        min_weight (float, optional): 权重下限。Defaults to 0.02.
+    '''
+
+    def __init__(self, status: Callable[[], dict], interval: float,
+                 reserve: Callable[[], float] | None = None, position_decay: float = 0.7,
+                 full_decay: float = 0.75, min_weight: float = 0.02):
+        self.status = status
+        self.interval = interval
+        self.reserve = reserve
+        self.position_decay = position_decay
+        self.full_decay = full_decay
+        self.min_weight = min_weight
+        self._pending: list[_Waiter] = []
+        self._full: dict[str, float] = {} # 课程ID -> 最近的尝试中课程已满的比例（指数移动平均）
+        self._credits: list[float] = [] # 没有 `reserve` 时各次重试机会产生的时刻（最小堆），与等待者一一对应
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name='scheduler')
+        self._thread.start()
+
+    def weight(self, course_id: str, position: int = 0, status: dict | None = None) -> float:
+        '''课程当前的权重，`status` 为 None 时读取最新的课程状态。'''
+        if status is None:
+            status = self.status() or {}
+        weight = scarcity_weight(status.get(str(course_id)))
+        weight *= self.position_decay ** position
+        weight *= 1 - self.full_decay * self._full.get(str(course_id), 0.0)
+        return max(self.min_weight, weight)
+
+    def report(self, course_id: str, outcome: Outcome):
+        '''记录一次尝试的结果。限流、服务器错误和会话过期与课程本身无关，不计入。'''
+        if outcome in (Outcome.THROTTLED, Outcome.SERVER_ERROR, Outcome.EXPIRED):
+            return
+        full = 1.0 if outcome is Outcome.FULL else 0.0
+        with self._cond:
+            self._full[str(course_id)] = 0.7 * self._full.get(str(course_id), full) + 0.3 * full
+
+    def submit(self, course_id: str, position: int = 0) -> Future:
+        '''排队等待下一次重试，返回的 Future 在轮到时完成，结果表示是否已经取得限速令牌。'''
+        waiter = _Waiter(str(course_id), position)
+        with self._cond:
+            if self._closed:
+                waiter.future.set_result(False)
+                return waiter.future
+            self._pending.append(waiter)
+            if self.reserve is None:
+                heapq.heappush(self._credits, waiter.since + self.interval)
+            self._cond.notify()
+        return waiter.future
+
+    def wait_turn(self, course_id: str, position: int = 0) -> bool:
+        '''阻塞直到轮到 `course_id` 重试，返回是否已经取得限速令牌。'''
+        return self.submit(course_id, position).result()
+
+    async def await_turn(self, course_id: str, position: int = 0) -> bool:
+        '''`wait_turn` 的异步版本。'''
+        import asyncio
+
+        return await asyncio.wrap_future(self.submit(course_id, position))
+
+    def close(self):
+        '''放行所有等待者并停止后台线程。'''
+        with self._cond:
+            self._closed = True
+            pending, self._pending = self._pending, []
+            self._credits.clear()
+            self._cond.notify()
+        for waiter in pending:
+            if waiter.future.set_running_or_notify_cancel():
+                waiter.future.set_result(False)
+        self._thread.join()
+
+    def _pick(self, now: float) -> _Waiter:
+        status = self.status() or {}
+        return max(self._pending, key=lambda waiter: self.weight(waiter.course_id, waiter.position, status)
+                   * (now - waiter.since))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+                if self.reserve is None:
+                    # 等到最早的一次重试机会产生，由此时排在最前的等待者使用，不一定是产生它的等待者
+                    wait = self._credits[0] - time.monotonic()
+                    if wait > 0:
+                        self._cond.wait(wait)
+                        continue
+                    heapq.heappop(self._credits)
+            if self.reserve is not None:
+                wait = self.reserve()
+                if wait > 0:
+                    time.sleep(wait)
+            with self._cond:
+                if not self._pending: # 等待者都已经被 `close` 放行
+                    continue
+                now = time.monotonic()
+                waiter = self._pick(now)
+                self._pending.remove(waiter)
+            if waiter.future.set_running_or_notify_cancel(): # 等待的协程被取消时跳过
+                metrics.retry_wait.observe(now - waiter.since)
+                waiter.future.set_result(self.reserve is not None)
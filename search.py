@@ -0,0 +1,127 @@
+'''课程列表的内存索引，用于在交互模式下快速查找课程。
+
+对课程名称（name）、课程序号（no）和教师（teachers）建立倒排索引。中文没有空格分词，
+这里以单字和相邻两字（bigram）为索引项：查询词的所有 bigram 都命中后再核对子串，
+单个字符的查询词直接使用单字索引。
+'''
+import heapq
+from collections import defaultdict
+
+fields = ('name', 'no', 'teachers')
+
+# 查询词命中各字段时的得分，课程名称最重要
+field_weights = {'name': 3, 'no': 2, 'teachers': 1}
+
+# 查询中可以用 `字段:词` 限定字段
+field_aliases = {'name': 'name', 'no': 'no', 'teacher': 'teachers', 'teachers': 'teachers'}
+
+
+def _grams(text: str) -> set[str]:
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class CourseIndex:
+    '''课程列表的倒排索引。
+
+    Args:
+        courses (list[dict]): `main.get_courses` 返回的课程列表。
+        status (dict | None, optional): `main.get_courses_status` 返回的课程状态，
+            用于判断课程是否有余量并参与排序。Defaults to None.
+    '''
+
+    def __init__(self, courses: list[dict], status: dict | None = None):
+        self.courses = courses
+        self.status = status or {}
+        self._text = [{field: str(course.get(field) or '').lower() for field in fields} for course in courses]
+        self._ids = {str(course.get('id')): i for i, course in enumerate(courses)}
+        self._index: dict[str, dict[str, set[int]]] = {field: defaultdict(set) for field in fields}
+        for i, text in enumerate(self._text):
+            for field in fields:
+                for gram in _grams(text[field]):
+                    self._index[field][gram].add(i)
+
+    def update_status(self, status: dict):
+        '''更新课程余量，之后的搜索按新的余量排序。'''
+        self.status = status
+
+    def seats(self, course: dict) -> tuple[int, int] | None:
+        '''返回课程的 (已选人数, 课容量)，没有状态信息时返回 None。'''
+        course_status = self.status.get(str(course.get('id')))
+        if not course_status:
+            return None
+        return course_status.get('sc', 0), course_status.get('lc', 0)
+
+    def available(self, course: dict) -> bool | None:
+        seats = self.seats(course)
+        return None if seats is None else seats[0] < seats[1]
+
+    def _match(self, field: str, term: str) -> set[int]:
+        if len(term) == 1:
+            return self._index[field].get(term, set())
+        postings = sorted((self._index[field].get(term[i:i + 2], set()) for i in range(len(term) - 1)), key=len)
+        if not postings[0]:
+            return set()
+        candidates = postings[0].intersection(*postings[1:])
+        return {i for i in candidates if term in self._text[i][field]}
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        '''搜索课程，所有查询词都必须命中。
+
+        查询词之间用空格分隔，不带前缀时在课程名称、课程序号和教师中查找；
+        `name:`、`no:`、`teacher:` 前缀限定字段，`id:` 按课程ID精确查找，
+        `is:available` 只保留有余量的课程。
+
+        结果按是否有余量、匹配得分、剩余名额排序。
+
+        Args:
+            query (str): 查询字符串，例如 `高等数学 teacher:张 is:available`。
+            limit (int, optional): 最多返回的课程数。Defaults to 20.
+
+        Returns:
+            list[dict]: 匹配的课程。
+        '''
+        matched: set[int] | None = None
+        scores: dict[int, int] = defaultdict(int)
+        only_available = False
+        for raw_term in query.lower().split():
+            prefix, _, term = raw_term.partition(':')
+            if not term or prefix not in (*field_aliases, 'id', 'is'):
+                prefix, term = '', raw_term
+            if prefix == 'is' and term == 'available':
+                only_available = True
+                continue
+            if prefix == 'id':
+                hits = {self._ids[term]} if term in self._ids else set()
+            else:
+                hits = set()
+                for field in ([field_aliases[prefix]] if prefix in field_aliases else fields):
+                    for i in self._match(field, term):
+                        hits.add(i)
+                        # 字段完全相同或以查询词开头时加分
+                        text = self._text[i][field]
+                        scores[i] += field_weights[field] * (3 if text == term else 2 if text.startswith(term) else 1)
+            matched = hits if matched is None else matched & hits
+            if not matched:
+                return []
+
+        candidates = range(len(self.courses)) if matched is None else matched
+        results = []
+        for i in candidates:
+            course = self.courses[i]
+            available = self.available(course)
+            if only_available and not available:
+                continue
+            seats = self.seats(course)
+            remaining = seats[1] - seats[0] if seats else 0
+            results.append(((available is not True, -scores[i], -remaining, i), course))
+        return [course for _, course in heapq.nsmallest(limit, results, key=lambda item: item[0])]
+
+    def format(self, course: dict) -> str:
+        '''把课程格式化为一行：ID、序号、名称、教师和余量。'''
+        seats = self.seats(course)
+        seats_text = f'{seats[0]}/{seats[1]}' if seats else '?'
+        return '\t'.join([str(course.get('id', 'N/A')).ljust(10),
+                          str(course.get('no', 'N/A')).ljust(10),
+                          str(course.get('name', 'N/A'))[:28].ljust(30),
+                          str(course.get('teachers', 'N/A'))[:18].ljust(20),
+                          seats_text])
@@ -0,0 +1,151 @@
+'''本地课表模型，用于在发送选课请求之前排除时间冲突的课程。
+
+课程列表中每门课程的 `arrangeInfo` 给出上课安排：星期（weekDay，1-7）、
+周次（weekState，第 i 个字符为 '1' 表示第 i 周上课）和节次（startUnit 到 endUnit）。
+每门课程的全部上课时间编码为一个整数位图，第 `(周 * 7 + 星期 - 1) * units_per_day + 节 - 1`
+位表示该时间有课，两门课程冲突当且仅当位图按位与不为0。
+
+`Timetable` 记录学生已经选上的课程，并提供两种检查：
+
+- `arrange`：在开始选课前，删去或运算中与已选课程冲突的分支，并把与表达式中
+  其他必选课程冲突的分支移到后面；
+- `conflicts`：每次选课尝试前检查课程是否与选课过程中新选上的课程冲突。
+'''
+import threading
+from typing import Iterable
+
+import exps
+
+# 每天最多的节次数，位图中每天占用的位数
+units_per_day = 16
+
+
+def _arrangements(course: dict) -> list[dict]:
+    arrange = course.get('arrangeInfo') or []
+    return arrange if isinstance(arrange, list) else []
+
+
+def course_mask(course: dict) -> int:
+    '''把课程的上课安排编码为位图，没有上课安排的课程为0，不与任何课程冲突。'''
+    mask = 0
+    for arrange in _arrangements(course):
+        try:
+            day = int(arrange['weekDay'])
+            start, end = int(arrange['startUnit']), int(arrange['endUnit'])
+            weeks = str(arrange['weekState'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not 1 <= day <= 7 or not 1 <= start <= end <= units_per_day:
+            continue
+        units = ((1 << (end - start + 1)) - 1) << (start - 1)
+        for week, state in enumerate(weeks):
+            if state == '1':
+                mask |= units << ((week * 7 + day - 1) * units_per_day)
+    return mask
+
+
+class Timetable:
+    '''学生在一个选课轮次中的课表。
+
+    Args:
+        catalog (list[dict]): `main.get_courses` 返回的课程列表。
+        elected_ids (Iterable, optional): 开始选课前已经选上的课程ID。Defaults to ().
+    '''
+
+    def __init__(self, catalog: list[dict], elected_ids: Iterable = ()):
+        self._courses = {str(course.get('id')): course for course in catalog}
+        self._masks: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.elected: set[str] = set()
+        self.mask = 0
+        for course_id in elected_ids:
+            self.add(course_id)
+
+    def mask_of(self, course_id: str) -> int:
+        '''课程的上课时间位图，只在第一次用到时计算。'''
+        course_id = str(course_id)
+        mask = self._masks.get(course_id)
+        if mask is None:
+            course = self._courses.get(course_id)
+            mask = self._masks[course_id] = course_mask(course) if course else 0
+        return mask
+
+    def add(self, course_id: str):
+        '''记录一门选上的课程。'''
+        course_id = str(course_id)
+        mask = self.mask_of(course_id)
+        with self._lock:
+            self.elected.add(course_id)
+            self.mask |= mask
+
+    def conflicts(self, course_id: str) -> bool:
+        '''课程是否与已选课程时间冲突，已经选上的课程本身不算冲突。'''
+        course_id = str(course_id)
+        return course_id not in self.elected and self.mask_of(course_id) & self.mask != 0
+
+    def required_mask(self, node: exps.Node) -> int:
+        '''表达式成功时一定会选上的课程的时间位图。'''
+        if isinstance(node, exps.Course):
+            return self.mask_of(node.id)
+        masks = [self.required_mask(item) for item in node.items]
+        if isinstance(node, exps.Or):
+            # 或运算只有所有分支都需要的时间才是必需的
+            result = masks[0]
+            for mask in masks[1:]:
+                result &= mask
+            return result
+        result = 0
+        for mask in masks:
+            result |= mask
+        return result
+
+    def _fails(self, node: exps.Node) -> bool:
+        '''表达式是否一定因为与已选课程冲突而失败。'''
+        if isinstance(node, exps.Course):
+            return self.conflicts(node.id)
+        if isinstance(node, exps.Or):
+            return all(self._fails(item) for item in node.items)
+        if isinstance(node, exps.And):
+            return any(self._fails(item) for item in node.items)
+        return self._fails(node.items[-1]) # 顺序运算的结果是最后一个子表达式的结果
+
+    def _arrange(self, node: exps.Node, context: int) -> exps.Node:
+        if isinstance(node, exps.Course):
+            return node
+        if isinstance(node, exps.Or):
+            items = [item for item in node.items if not self._fails(item)] or list(node.items)
+            items = [self._arrange(item, context) for item in items]
+            # 与其他必选课程冲突的分支即使选上也会让其他部分失败，稳定排序保留其余分支的原有顺序
+            items.sort(key=lambda item: self.required_mask(item) & context != 0)
+            return items[0] if len(items) == 1 else exps.Or(tuple(items))
+        masks = [self.required_mask(item) for item in node.items]
+        items = []
+        for i, item in enumerate(node.items):
+            sibling_mask = context
+            for j, mask in enumerate(masks):
+                if j != i:
+                    sibling_mask |= mask
+            items.append(self._arrange(item, sibling_mask))
+        return type(node)(tuple(items))
+
+    def arrange(self, plans: list[tuple[str, exps.Node]]) -> list[tuple[str, exps.Node]]:
+        '''调整各个表达式中或运算的分支。
+
+        删去一定会因时间冲突而失败的分支（全部分支都冲突时保留原样，由服务器给出结果），
+        并把与其他表达式或同一表达式中其他必选课程冲突的分支移到后面。
+
+        Args:
+            plans (list[tuple[str, exps.Node]]): `main.compile_courses_exps` 编译得到的表达式。
+
+        Returns:
+            list[tuple[str, exps.Node]]: 原始表达式字符串及调整后的语法树。
+        '''
+        masks = [self.required_mask(node) for _, node in plans]
+        arranged = []
+        for i, (exp, node) in enumerate(plans):
+            context = 0
+            for j, mask in enumerate(masks):
+                if j != i:
+                    context |= mask
+            arranged.append((exp, self._arrange(node, context)))
+        return arranged
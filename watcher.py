@@ -0,0 +1,86 @@
+'''课程余量监视器。
+
+后台线程按固定频率查询课程的已选人数和课容量，维护一份带版本号的共享快照。
+课程已满时，选课循环不再按固定间隔盲目发送选课请求，而是等待监视器报告出现空位。
+'''
+import threading
+import time
+from typing import Callable
+
+
+class CapacityWatcher:
+    '''轮询 `fetch()` 并保存最新的课程状态快照。
+
+    Args:
+        fetch (Callable[[], dict]): 返回课程状态的函数，格式同 `main.get_courses_status`，
+            即 `{课程ID: {'sc': 已选人数, 'lc': 课容量}}`。
+        poll_interval (float): 两次查询之间的间隔（秒）。
+    '''
+
+    def __init__(self, fetch: Callable[[], dict], poll_interval: float):
+        self.fetch = fetch
+        self.poll_interval = poll_interval
+        self.data = {}  # 每次更新都替换为新的字典，读取时无需加锁
+        self.version = 0
+        self.updated_at = 0.0
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        '''查询一次课程状态并更新快照，唤醒所有等待的选课循环。'''
+        data = self.fetch()
+        with self._cond:
+            self.data = data
+            self.version += 1
+            self.updated_at = time.monotonic()
+            self._cond.notify_all()
+
+    def start(self):
+        '''同步查询一次以获得初始快照，然后在后台线程中持续轮询。'''
+        self.poll()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _run(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f'[Warning] Capacity watcher failed to fetch course status: {e}')
+
+    def has_seat(self, course_id: str) -> bool | None:
+        '''根据最新快照判断课程是否有空位，快照中没有该课程时返回 None。'''
+        status = self.data.get(str(course_id))
+        if not status:
+            return None
+        return status.get('sc', 0) < status.get('lc', 0)
+
+    def _ready(self, course_id: str, after_version: int) -> bool:
+        if self._stopped.is_set():
+            return True
+        return self.version > after_version and self.has_seat(course_id) is not False
+
+    def wait_for_seat(self, course_id: str, after_version: int, timeout: float | None = None) -> bool:
+        '''阻塞直到比 `after_version` 更新的快照报告课程有空位（或监视器停止）。
+
+        只接受更新的快照，保证即使快照与服务器的判断不一致，同一课程每个轮询周期最多重试一次。
+        快照中没有该课程时，每次快照更新都会返回。
+
+        Returns:
+            bool: 超时返回 False，否则返回 True。
+        '''
+        with self._cond:
+            return self._cond.wait_for(lambda: self._ready(course_id, after_version), timeout)
+
+    async def await_seat(self, course_id: str, after_version: int):
+        '''`wait_for_seat` 的异步版本。'''
+        import asyncio
+
+        while not self._ready(course_id, after_version):
+            await asyncio.sleep(min(self.poll_interval, 0.1))